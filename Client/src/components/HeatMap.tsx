@@ -2,7 +2,11 @@
 
 import { useEffect, useState } from "react";
 import StockDetails from "./StockDetails";
-import { fetchStockData } from "../services/stockService";
+import {
+  fetchStockData,
+  subscribeToStockUpdates,
+  applySectorDelta,
+} from "../services/stockService";
 import { StockData, SectorData } from "../types";
 import { sampleData } from "@/sample/sampleData";
 import Toggle from "./ToggleButton";
@@ -68,13 +72,6 @@ export default function HeatMap() {
         // Call the API service function
         const data = await fetchStockData();
         setHeatmapData(data);
-
-        const sectorMaxCaps: Record<string, number> = {};
-        data.forEach((sector) => {
-          console.log("🚀 ~ data.forEach ~ sector:", sector);
-          sectorMaxCaps[sector.name] = sector.stocks[0].marketCap || 1;
-        });
-        setMaxSectorMarketCap(sectorMaxCaps);
       } catch (err) {
         setError("Failed to load stock data. Please try again later.");
         console.error("Error loading stock data:", err);
@@ -85,12 +82,24 @@ export default function HeatMap() {
     // Load data on component mount
     loadStockData();
 
-    // Optional: Set up a refresh interval
-    const refreshInterval = setInterval(loadStockData, 300000); // Refresh every 5 minutes
+    // Receive updates pushed by the server instead of polling
+    const unsubscribe = subscribeToStockUpdates(
+      (sectors) => setHeatmapData(sectors),
+      (delta) => setHeatmapData((prev) => applySectorDelta(prev, delta))
+    );
 
-    // Clean up the interval on component unmount
-    return () => clearInterval(refreshInterval);
+    // Close the stream on component unmount
+    return unsubscribe;
   }, []);
+
+  // Largest market cap per sector, for sector-relative tile sizes
+  useEffect(() => {
+    const sectorMaxCaps: Record<string, number> = {};
+    heatmapData.forEach((sector) => {
+      sectorMaxCaps[sector.name] = sector.stocks[0]?.marketCap || 1;
+    });
+    setMaxSectorMarketCap(sectorMaxCaps);
+  }, [heatmapData]);
   // Function to handle manual refresh
   const handleRefresh = async () => {
     try {
@@ -1,7 +1,7 @@
 // Constants
 const API_KEY = process.env.NEXT_PUBLIC_ALPHAVANTAGE_API_KEY || 'demo';
 const BASE_URL = 'http://localhost:5000/api/stocks';
-import { StockData, SectorData, GlobalQuote, CompanyOverview , StockResponse} from "../types";
+import { StockData, SectorData, GlobalQuote, CompanyOverview , StockResponse, SectorDelta} from "../types";
 
 /**
  * Get a real-time quote for a specific stock
@@ -104,6 +104,75 @@ export const fetchStockData = async (
   }
 };
 
+// How often the heat map is polled when the backend does not serve streams
+const POLL_INTERVAL_MS = 30000;
+
+/**
+ * Subscribe to live heat map updates pushed by the backend (Server-Sent Events)
+ * The browser reconnects on its own and resumes from the last version it saw.
+ * The stream covers the same stocks as fetchStockData() without arguments; if
+ * the backend refuses it (no gevent workers, too many streams), the heat map
+ * is polled instead.
+ * @param onSnapshot Called with the full sector data
+ * @param onDelta Called with changed tiles and removed symbols
+ * @returns Function that closes the subscription
+ */
+export const subscribeToStockUpdates = (
+  onSnapshot: (sectors: SectorData[]) => void,
+  onDelta: (delta: SectorDelta) => void
+): (() => void) => {
+  const source = new EventSource('http://localhost:5000/api/stream');
+  let poller: ReturnType<typeof setInterval> | null = null;
+
+  source.addEventListener('snapshot', (event) => {
+    const data: StockResponse = JSON.parse((event as MessageEvent).data);
+    onSnapshot(data.sectors || []);
+  });
+  source.addEventListener('delta', (event) => {
+    onDelta(JSON.parse((event as MessageEvent).data));
+  });
+  source.addEventListener('error', () => {
+    // The browser only gives up on a stream the backend refused
+    if (source.readyState !== EventSource.CLOSED || poller !== null) return;
+    poller = setInterval(() => {
+      fetchStockData().then(onSnapshot).catch(() => {});
+    }, POLL_INTERVAL_MS);
+  });
+
+  return () => {
+    source.close();
+    if (poller !== null) clearInterval(poller);
+  };
+};
+
+/**
+ * Apply a delta to sector data, keeping the backend ordering
+ * (larger market cap first, then larger absolute change)
+ * @param sectors Current sector data
+ * @param delta Changed tiles and removed symbols
+ * @returns New sector data
+ */
+export const applySectorDelta = (sectors: SectorData[], delta: SectorDelta): SectorData[] => {
+  const replaced = new Set([...delta.removed, ...delta.changed.map(stock => stock.ticker)]);
+  const bySector = new Map<string, StockData[]>(
+    sectors.map(sector => [sector.name, sector.stocks.filter(stock => !replaced.has(stock.ticker))])
+  );
+
+  delta.changed.forEach(stock => {
+    if (!bySector.has(stock.sector)) bySector.set(stock.sector, []);
+    bySector.get(stock.sector)!.push(stock);
+  });
+
+  return Array.from(bySector.entries())
+    .filter(([, stocks]) => stocks.length > 0)
+    .map(([name, stocks]) => ({
+      name,
+      stocks: stocks.sort((a, b) =>
+        (b.marketCap || 0) - (a.marketCap || 0) || Math.abs(b.change) - Math.abs(a.change)
+      ),
+    }));
+};
+
 /**
  * Batch fetch real-time quotes for multiple stocks
  */
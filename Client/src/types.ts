@@ -14,6 +14,15 @@ export type StockData = {
   
 export interface StockResponse {
     sectors: SectorData[];
+    version?: number | null;
+    timestamp: string;
+  }
+
+export interface SectorDelta {
+    version: number;
+    since: number;
+    changed: StockData[];
+    removed: string[];
     timestamp: string;
   }
   
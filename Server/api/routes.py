@@ -1,14 +1,36 @@
+import math
+import time
 import logging
 from flask import Blueprint, jsonify, request, current_app
-from data.sources import get_stock_data, get_sector_data, get_historical_data, get_yahoo_finance_data, DEFAULT_SYMBOLS
-from utils.cache import get_cached_data, cache_data
+from data.sources import (get_quotes_within, get_yahoo_quotes_within, get_sector_data, get_historical_data,
+                          iter_historical_data, snapshot_event, DEFAULT_SYMBOLS, STREAM_SYMBOLS)
+from utils.cache import get_or_compute, get_cache_stats
 from datetime import datetime, timedelta
-from data.processors import process_stocks_by_sector
+from data.processors import process_sector_delta
+from data.quotes import normalize_symbols, record_demand
+from data.versions import latest_snapshot, snapshot_delta
+from data.views import (encode_stocks_view, encode_stocks_by_sector_view, stocks_cache_key,
+                        stocks_by_sector_cache_key, SECTORS_CACHE_KEY, VIEW_TTLS, STOCKS_DEFAULT_LIMIT,
+                        STOCKS_BY_SECTOR_DEFAULT_LIMIT, DEFAULT_LARGE_CAP_THRESHOLD, REQUEST_DEADLINE_SECONDS,
+                        MIN_REQUEST_DEADLINE_SECONDS, MAX_REQUEST_DEADLINE_SECONDS, SCREENER_DEFAULT_LIMIT, MOVERS_DEFAULT_LIMIT, partial_view_ttls,
+                        encode_movers_view, movers_cache_key)
+from utils.http_cache import encode_json, negotiate_format, send_encoded, send_event_stream, stream_ndjson
+from utils.events import subscribe, unsubscribe, iter_events, format_event, get_stream_stats, streams_available
+from utils.providers import get_provider_health
+from data.screener import screen_stocks, get_index_stats, SORTABLE_FIELDS
 
 logger = logging.getLogger(__name__)
 
 api_bp = Blueprint('api', __name__)
 
+def _request_budget():
+    """Seconds the request may spend on upstream calls, from ?deadline= or the server default"""
+    budget = float(request.args.get('deadline', REQUEST_DEADLINE_SECONDS))
+    # NaN fails both comparisons and would disable the deadline
+    if budget != budget:
+        budget = REQUEST_DEADLINE_SECONDS
+    return min(max(budget, MIN_REQUEST_DEADLINE_SECONDS), MAX_REQUEST_DEADLINE_SECONDS)
+
 @api_bp.route('/stocks', methods=['GET'])
 def stocks():
     """
@@ -16,34 +38,46 @@ def stocks():
     
     Query parameters:
     - symbols: Comma-separated list of stock symbols (optional)
-    - sector: Filter by sector (optional)
+    - sector: Filter by sector (optional). Without symbols this returns
+      sector performance instead, and limit keeps the sectors with the
+      largest absolute change
     - limit: Number of stocks to return (default: 30)
+    - deadline: Seconds to wait for upstream providers, 1 to 30 (default: 5). Symbols
+      not fetched in time are served from their last known quote and listed
+      under "stale", or left out and listed under "missing"
+    
+    Stock lists are also available as Arrow IPC or MessagePack columns by
+    sending an Accept header of application/vnd.apache.arrow.stream or
+    application/msgpack.
     """
     try:
-        symbols = request.args.get('symbols')
+        symbol_list = normalize_symbols(request.args.get('symbols') or '')
+        symbols = ','.join(symbol_list) or None
         sector = request.args.get('sector')
-        limit = int(request.args.get('limit', 30))
+        limit = int(request.args.get('limit', STOCKS_DEFAULT_LIMIT))
+        budget = _request_budget()
+        record_demand(symbol_list)
         
-        # Use cache for frequent requests
-        cache_key = f"stocks_{symbols}_{sector}_{limit}"
-        cached_result = get_cached_data(cache_key)
+        # Sector performance has no binary layout and is always sent as JSON
+        output_format = negotiate_format() if symbols or not sector else 'json'
         
-        if cached_result:
-            logger.debug(f"Serving cached stock data for {cache_key}")
-            return jsonify(cached_result)
+        def encode():
+            # The deadline starts with the computation, also for background refreshes
+            deadline = time.monotonic() + budget
+            if sector and not symbols:
+                return encode_json(get_sector_data(sector, limit, deadline))
+            quotes, stale, missing = get_quotes_within(symbol_list, limit, deadline)
+            return encode_stocks_view(quotes, output_format, stale, missing)
         
-        if symbols:
-            symbol_list = [s.strip().upper() for s in symbols.split(',')]
-            data = get_stock_data(symbol_list)
-        elif sector:
-            data = get_sector_data(sector, limit)
-        else:
-            data = get_stock_data(limit=limit)
+        # Use cache for frequent requests, computed once for concurrent callers;
+        # the default view is precomputed by the refresh job under the same key
+        cache_key = stocks_cache_key(symbols, sector, limit, output_format)
         
-        # Cache the result for 5 minutes
-        cache_data(cache_key, data, timeout=300)
+        # Cache the result for 5 minutes, serve it stale for up to 30 minutes while refreshing
+        ttl, hard_ttl = VIEW_TTLS['stocks']
+        encoded = get_or_compute(cache_key, encode, ttl=ttl, hard_ttl=hard_ttl, ttl_for=partial_view_ttls)
         
-        return jsonify(data)
+        return send_encoded(encoded, vary_accept=True)
     except Exception as e:
         logger.error(f"Error fetching stock data: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
@@ -56,56 +90,70 @@ def historical():
     Query parameters:
     - symbols: Comma-separated list of stock symbols (required)
     - days: Number of days of historical data (default: 30)
+    - orient: "records" for one object per day (default) or "columns" for one
+      array per field
+    - format: "json" (default) or "ndjson" to stream one line per symbol
     """
     try:
         symbols = request.args.get('symbols')
         days = int(request.args.get('days', 30))
+        orient = request.args.get('orient', 'records')
+        output_format = request.args.get('format', 'json')
         
-        if not symbols:
+        if orient not in ('records', 'columns'):
+            return jsonify({'error': 'orient must be "records" or "columns"'}), 400
+        
+        if output_format not in ('json', 'ndjson'):
+            return jsonify({'error': 'format must be "json" or "ndjson"'}), 400
+        
+        symbol_list = normalize_symbols(symbols or '')
+        
+        if not symbol_list:
             return jsonify({'error': 'Symbol parameter is required'}), 400
-            
-        symbol_list = [s.strip().upper() for s in symbols.split(',')]
         
-        # Use cache for frequent requests
-        cache_key = f"historical_{','.join(symbol_list)}_{days}"
-        cached_result = get_cached_data(cache_key)
+        if output_format == 'ndjson':
+            end_date = datetime.now()
+            return stream_ndjson(_historical_lines(symbol_list, end_date - timedelta(days=days), end_date, orient))
         
-        if cached_result:
-            logger.debug(f"Serving cached historical data for {cache_key}")
-            return jsonify(cached_result)
-            
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
+        def fetch():
+            end_date = datetime.now()
+            start_date = end_date - timedelta(days=days)
+            return get_historical_data(symbol_list, start_date, end_date, orient=orient)
         
-        data = get_historical_data(symbol_list, start_date, end_date)
+        # Use cache for frequent requests
+        cache_key = f"historical_{','.join(symbol_list)}_{days}_{orient}"
         
-        # Cache the result for 60 minutes for historical data
-        cache_data(cache_key, data, timeout=3600)
+        # Cache the result for 60 minutes for historical data, serve stale for up to 6 hours
+        encoded = get_or_compute(cache_key, lambda: encode_json(fetch()), ttl=3600, hard_ttl=6 * 3600)
         
-        return jsonify(data)
+        return send_encoded(encoded)
     except Exception as e:
         logger.error(f"Error fetching historical data: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+def _historical_lines(symbol_list, start_date, end_date, orient):
+    """Yield one NDJSON record per symbol, then a closing record with the timestamp"""
+    try:
+        for symbol, entry in iter_historical_data(symbol_list, start_date, end_date, orient=orient):
+            yield {'symbol': symbol, **entry}
+    except Exception as e:
+        # Headers are already sent, so report the failure in-band
+        logger.error(f"Error streaming historical data: {str(e)}", exc_info=True)
+        yield {'error': str(e)}
+        return
+    yield {'done': True, 'timestamp': datetime.now().isoformat()}
+
 @api_bp.route('/sectors', methods=['GET'])
 def sectors():
     """Get performance data by sectors for heat map visualization"""
     try:
-        # Use cache for frequent requests
-        cache_key = "sectors_data"
-        cached_result = get_cached_data(cache_key)
-        
-        if cached_result:
-            logger.debug("Serving cached sector data")
-            return jsonify(cached_result)
-            
         # Get sector performance data - using a large limit to get all sectors
-        data = get_sector_data(limit=100)
+        # Cache the result for 15 minutes, serve stale for up to an hour
+        ttl, hard_ttl = VIEW_TTLS['sectors']
+        encoded = get_or_compute(SECTORS_CACHE_KEY, lambda: encode_json(get_sector_data(limit=100)),
+                                 ttl=ttl, hard_ttl=hard_ttl)
         
-        # Cache the result for 15 minutes
-        cache_data(cache_key, data, timeout=900)
-        
-        return jsonify(data)
+        return send_encoded(encoded)
     except Exception as e:
         logger.error(f"Error fetching sector data: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
@@ -119,61 +167,239 @@ def stocks_by_sector():
     - symbols: Comma-separated list of stock symbols (optional)
     - limit: Number of stocks to return (default: 100)
     - large_cap_threshold: Market cap threshold in $ for isLarge flag (default: 100,000,000,000)
+    - top: Maximum number of stocks per sector, the ones with the largest
+      market cap (optional, default: all). Responses with top are always
+      full, since is ignored
+    - since: Snapshot version the client already has (optional). Only tiles
+      whose price or change moved since then are returned, with the symbols
+      that were removed; falls back to a full response when the version is
+      no longer available. Deltas are always JSON, whatever the Accept header
+    - deadline: Seconds to wait for upstream providers, 1 to 30 (default: 5). Symbols
+      not fetched in time are served from their last known quote and listed
+      under "stale", or left out and listed under "missing"
+    
+    Send an Accept header of application/vnd.apache.arrow.stream or
+    application/msgpack to get one flat set of columns instead of JSON.
     """
     try:
-        symbols = request.args.get('symbols')
-        limit = int(request.args.get('limit', 100))
-        large_cap_threshold = int(float(request.args.get('large_cap_threshold', 100000000000)))
+        symbol_list = normalize_symbols(request.args.get('symbols') or '')
+        symbols = ','.join(symbol_list) or None
+        limit = int(request.args.get('limit', STOCKS_BY_SECTOR_DEFAULT_LIMIT))
+        large_cap_threshold = int(float(request.args.get('large_cap_threshold', DEFAULT_LARGE_CAP_THRESHOLD)))
+        top = request.args.get('top')
+        top = int(top) if top else None
+        if top is not None and top < 1:
+            return jsonify({'error': 'top must be at least 1'}), 400
+        since = request.args.get('since')
+        if since and not since.isdigit():
+            return jsonify({'error': 'since must be a snapshot version'}), 400
+        budget = _request_budget()
+        output_format = negotiate_format()
+        record_demand(symbol_list)
+        universe = symbol_list if symbols else DEFAULT_SYMBOLS[:limit]
         
-        # Use cache for frequent requests
-        cache_key = f"stocks_by_sector_{symbols}_{limit}_{large_cap_threshold}"
-        cached_result = get_cached_data(cache_key)
-        
-        if cached_result:
-            logger.debug(f"Serving cached stocks by sector data for {cache_key}")
-            return jsonify(cached_result)
-        
-        # Get raw stock data
-        if symbols:
-            symbol_list = [s.strip().upper() for s in symbols.split(',')]
-            stock_data_raw = get_yahoo_finance_data(symbol_list)
-        else:
-            symbol_list = DEFAULT_SYMBOLS[:limit]
-            stock_data_raw = get_yahoo_finance_data(symbol_list)
-            
-        # Convert raw data to the format expected by process_stocks_by_sector
-        stock_data = {
-            "items": [{
-                "symbol": item.get("symbol"),
-                "name": item.get("name"),
-                "price": item.get("price"),
-                "change_percent": item.get("change_percent"),
-                "marketCap": item.get("marketCap"),
-                "sector": item.get("sector"),
-                "industry": item.get("industry")
-            } for item in stock_data_raw]
-        }
-        
-        # Process data into the desired format
-        sector_data = process_stocks_by_sector(stock_data, large_cap_threshold=large_cap_threshold)
-        
-        result = {
-            'sectors': sector_data,
-            'timestamp': datetime.now().isoformat()
-        }
+        # A delta cannot tell which tiles moved into a sector's top
+        if since and top is None:
+            delta = snapshot_delta(int(since), universe)
+            if delta is not None:
+                return send_encoded(encode_json(process_sector_delta(delta, large_cap_threshold)), vary_accept=True)
+        
+        # Use the published snapshot when it covers the request so the
+        # response carries a version the client can ask for deltas from
+        snapshot = latest_snapshot(universe)
+        version = snapshot.version if snapshot is not None else None
         
-        # Cache the result for 5 minutes
-        cache_data(cache_key, result, timeout=300)
+        def encode():
+            if snapshot is not None:
+                stock_data_raw = [snapshot.quotes[s] for s in universe if s in snapshot.quotes]
+                return encode_stocks_by_sector_view(stock_data_raw, large_cap_threshold, version, output_format,
+                                                    top=top)
+            # Otherwise get raw stock data, served per symbol from the quote store
+            # and filled from last known quotes when the download runs out of time
+            stock_data_raw, stale, missing = get_yahoo_quotes_within(universe, time.monotonic() + budget)
+            return encode_stocks_by_sector_view(stock_data_raw, large_cap_threshold, version, output_format,
+                                                stale, missing, top)
         
-        return jsonify(result)
+        # Use cache for frequent requests; a new snapshot version gets a new key.
+        # Default views are precomputed by the refresh job under the same keys
+        cache_key = stocks_by_sector_cache_key(symbols, limit, large_cap_threshold, version, output_format, top)
+        
+        # Cache the result for 5 minutes; dashboards poll every 5 minutes, so serve
+        # stale for up to an hour while a background refresh runs
+        ttl, hard_ttl = VIEW_TTLS['stocks_by_sector']
+        encoded = get_or_compute(cache_key, encode, ttl=ttl, hard_ttl=hard_ttl, ttl_for=partial_view_ttls)
+        
+        return send_encoded(encoded, vary_accept=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error fetching stocks by sector: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+@api_bp.route('/screener', methods=['GET'])
+def screener():
+    """
+    Filter the live universe by stock attributes
+    
+    Served from indexes kept up to date by the refresh job, so the cost of a
+    query follows the number of matches rather than the universe size.
+    
+    Query parameters:
+    - sector: Comma-separated sectors (optional)
+    - industry: Comma-separated industries (optional)
+    - min_market_cap, max_market_cap: Market cap range in $ (optional)
+    - min_change, max_change: Change percent range (optional)
+    - sort: change_percent (default), marketCap, volume or price
+    - order: "desc" (default) or "asc"
+    - limit: Number of stocks to return (default: 50)
+    """
+    try:
+        def number(name):
+            value = request.args.get(name)
+            if value in (None, ''):
+                return None
+            number = float(value)
+            if not math.isfinite(number):
+                raise ValueError(f"{name} must be a finite number")
+            return number
+        
+        def names(name):
+            return [value.strip() for value in request.args.get(name, '').split(',') if value.strip()]
+        
+        order = request.args.get('order', 'desc')
+        if order not in ('asc', 'desc'):
+            return jsonify({'error': 'order must be "asc" or "desc"'}), 400
+        
+        sort = request.args.get('sort', 'change_percent')
+        if sort not in SORTABLE_FIELDS:
+            return jsonify({'error': f"sort must be one of {', '.join(SORTABLE_FIELDS)}"}), 400
+        
+        limit = int(request.args.get('limit', SCREENER_DEFAULT_LIMIT))
+        if limit < 1:
+            return jsonify({'error': 'limit must be at least 1'}), 400
+        
+        quotes, version = screen_stocks(
+            sectors=names('sector'),
+            industries=names('industry'),
+            min_market_cap=number('min_market_cap'),
+            max_market_cap=number('max_market_cap'),
+            min_change=number('min_change'),
+            max_change=number('max_change'),
+            sort=sort,
+            descending=order == 'desc',
+            limit=limit
+        )
+        
+        return send_encoded(encode_json({
+            'items': [quote.to_dict() for quote in quotes],
+            'version': version,
+            'timestamp': datetime.now().isoformat()
+        }))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error screening stocks: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/movers', methods=['GET'])
+def movers():
+    """
+    Get the top gainers and losers of the default universe
+    
+    The default limit is precomputed for the whole universe and for every
+    sector each time the refresh job publishes a snapshot; other limits are
+    selected from the snapshot once per version.
+    
+    Query parameters:
+    - sector: Only stocks of this sector (optional)
+    - limit: Number of gainers and of losers to return (default: 10)
+    - deadline: Seconds to wait for upstream providers when no snapshot has
+      been published yet, 1 to 30 (default: 5)
+    """
+    try:
+        sector = (request.args.get('sector') or '').strip().upper() or None
+        limit = int(request.args.get('limit', MOVERS_DEFAULT_LIMIT))
+        if limit < 1:
+            return jsonify({'error': 'limit must be at least 1'}), 400
+        budget = _request_budget()
+        
+        # The universe lists a few symbols twice; movers list every stock once
+        universe = list(dict.fromkeys(DEFAULT_SYMBOLS))
+        snapshot = latest_snapshot(universe)
+        version = snapshot.version if snapshot is not None else None
+        
+        def encode():
+            if snapshot is not None:
+                quotes = [snapshot.quotes[s] for s in universe if s in snapshot.quotes]
+                return encode_movers_view(quotes, limit, version, sector)
+            quotes, stale, missing = get_yahoo_quotes_within(universe, time.monotonic() + budget)
+            return encode_movers_view(quotes, limit, version, sector, stale, missing)
+        
+        ttl, hard_ttl = VIEW_TTLS['movers']
+        encoded = get_or_compute(movers_cache_key(sector, limit, version), encode,
+                                 ttl=ttl, hard_ttl=hard_ttl, ttl_for=partial_view_ttls)
+        
+        return send_encoded(encoded)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error fetching movers: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/stream', methods=['GET'])
+def stream():
+    """
+    Push heat map updates as Server-Sent Events
+    
+    A "snapshot" event with the stocks of the default /stocks-by-sector view
+    grouped by sector is sent on connect, then a "delta" event with the
+    changed tiles and removed symbols whenever the refresh job publishes a
+    new version. Event ids are snapshot versions, so a reconnecting browser
+    resumes with a delta from its Last-Event-ID.
+    
+    Streams are only served on gevent workers (or with STREAM_THREADED_WORKERS
+    set); elsewhere this answers 503 and clients poll /stocks-by-sector.
+    
+    Query parameters:
+    - since: Snapshot version to resume from (optional, same as Last-Event-ID)
+    """
+    if not streams_available():
+        return jsonify({'error': 'Event streams need gevent workers, poll /api/stocks-by-sector instead'}), 503
+    
+    subscriber = subscribe()
+    if subscriber is None:
+        return jsonify({'error': 'Too many open streams, try again later'}), 503
+    
+    try:
+        since = request.headers.get('Last-Event-ID') or request.args.get('since')
+        initial = []
+        snapshot = latest_snapshot()
+        if snapshot is not None:
+            delta = snapshot_delta(int(since), STREAM_SYMBOLS) if since and since.isdigit() else None
+            if delta is not None:
+                initial.append(format_event('delta', process_sector_delta(delta), event_id=delta['version']))
+            else:
+                # Every client connecting to the same version gets the same bytes
+                initial.append(get_or_compute(
+                    f"stream_snapshot_{snapshot.version}",
+                    lambda: format_event('snapshot', snapshot_event(snapshot), event_id=snapshot.version),
+                    ttl=3600
+                ))
+        
+        return send_event_stream(iter_events(subscriber, initial))
+    except Exception as e:
+        unsubscribe(subscriber)
+        logger.error(f"Error opening event stream: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
 @api_bp.route('/status', methods=['GET'])
 def status():
     """API status endpoint"""
     return jsonify({
         'status': 'online',
+        'cache': get_cache_stats(),
+        'streams': get_stream_stats(),
+        'providers': get_provider_health(),
+        'screener': get_index_stats(),
         'timestamp': datetime.now().isoformat()
     })
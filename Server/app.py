@@ -1,10 +1,14 @@
 import os
 import logging
+from datetime import datetime
 from flask import Flask
 from flask_cors import CORS
 from apscheduler.schedulers.background import BackgroundScheduler
 from utils.logging_config import configure_logging
-from data.sources import update_stock_data
+from data.sources import update_stock_data, DEFAULT_SYMBOLS
+from data.metadata import load_metadata_store, refresh_ticker_metadata
+from data.refresh import refresh_tick, REFRESH_TICK_SECONDS
+from utils.cache import cleanup_expired_cache
 from api.routes import api_bp
 
 # Configure application logging
@@ -21,9 +25,21 @@ CORS(app, resources={r"/*": {"origins": "*"}})
 # Register blueprints
 app.register_blueprint(api_bp, url_prefix='/api')
 
+# Load persisted ticker metadata (name, sector, industry, market cap)
+load_metadata_store()
+
 # Set up background scheduler for data updates
 scheduler = BackgroundScheduler()
-scheduler.add_job(update_stock_data, 'interval', minutes=60)
+# Load the whole universe once at startup, then refresh it shard by shard
+# at a pace that follows the exchange calendar
+scheduler.add_job(update_stock_data, next_run_time=datetime.now())
+scheduler.add_job(refresh_tick, 'interval', seconds=REFRESH_TICK_SECONDS,
+                  max_instances=1, coalesce=True)
+# Refresh stale ticker metadata in bulk, starting right away
+scheduler.add_job(refresh_ticker_metadata, 'interval', hours=1, args=[DEFAULT_SYMBOLS],
+                  next_run_time=datetime.now(), max_instances=1, coalesce=True)
+# Sweep expired cache entries so keys that are never read again free their memory
+scheduler.add_job(cleanup_expired_cache, 'interval', minutes=1)
 scheduler.start()
 
 logger.info("Stock Market API initialized")
@@ -0,0 +1,348 @@
+import os
+import json
+import logging
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from threading import Lock
+import numpy as np
+from utils.market_hours import EXCHANGE_TZ, is_trading_day
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock, byte-range locks from msvcrt are used instead
+    fcntl = None
+    import msvcrt
+
+# Configure module logger
+logger = logging.getLogger(__name__)
+
+# Directory holding one file of daily bars per symbol plus index.json
+HISTORY_STORE_DIR = os.environ.get(
+    "HISTORY_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "history")
+)
+
+# Bar file layout: a fixed header (magic, int64 row count, reserved) followed
+# by one contiguous array per column in this order, each `rows` items long.
+# Every column is 8 bytes per row, so column k starts at HEADER_SIZE + k * rows * 8.
+BAR_MAGIC = b"OHLCV\x00\x01\x00"
+HEADER_SIZE = 32
+BAR_COLUMNS = (
+    ("date", np.int64),  # days since 1970-01-01
+    ("open", np.float64),
+    ("high", np.float64),
+    ("low", np.float64),
+    ("close", np.float64),
+    ("volume", np.int64),
+)
+BAR_FIELDS = ("open", "high", "low", "close", "volume")
+
+# Mapped bar files: symbol -> ((inode, mtime), BarWindow over the whole file)
+_mapped = {}
+# Parsed index file: (mtime, {symbol: entry})
+_index = (None, {})
+_store_lock = Lock()
+
+class BarWindow:
+    """
+    Daily bars for one symbol as column arrays
+
+    Arrays read from the store are views into the memory-mapped file, so
+    slicing a window copies nothing and the pages are shared by every worker
+    process through the OS page cache.
+    """
+
+    __slots__ = ("date", "open", "high", "low", "close", "volume")
+
+    def __init__(self, date, open, high, low, close, volume):
+        self.date = date
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    def __len__(self):
+        return len(self.date)
+
+    def slice(self, start, end):
+        """Bars with start <= date < end, as views of these arrays"""
+        lo, hi = np.searchsorted(self.date, [start, end])
+        return BarWindow(*(getattr(self, field)[lo:hi] for field in self.__slots__))
+
+def _empty_window():
+    return BarWindow(
+        np.array([], dtype="datetime64[D]"),
+        *(np.array([], dtype=dtype) for _, dtype in BAR_COLUMNS[1:])
+    )
+
+def _as_day(value):
+    """Convert a date/datetime/string to numpy datetime64[D]"""
+    if isinstance(value, datetime):
+        value = value.date()
+    return np.datetime64(value, "D")
+
+def _has_trading_days(start, end):
+    """Whether the exchange was open on any day from start up to (excluding) end"""
+    day, end = start.astype(date), end.astype(date)
+    while day < end:
+        if is_trading_day(day):
+            return True
+        day += timedelta(days=1)
+    return False
+
+def _last_final_day():
+    """Day after the last exchange day whose bar is final: today, or tomorrow if there is no session today"""
+    today = datetime.now(EXCHANGE_TZ).date()
+    return _as_day(today if is_trading_day(today) else today + timedelta(days=1))
+
+def _symbol_path(symbol):
+    # Symbols such as BRK.B are safe as file names, but keep path separators out
+    return os.path.join(HISTORY_STORE_DIR, f"{symbol.replace('/', '_')}.bars")
+
+def _index_path():
+    return os.path.join(HISTORY_STORE_DIR, "index.json")
+
+@contextmanager
+def _index_file_lock():
+    """Serialize bar file and index updates across worker processes"""
+    os.makedirs(HISTORY_STORE_DIR, exist_ok=True)
+    with open(os.path.join(HISTORY_STORE_DIR, "index.lock"), "w") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            # LK_LOCK gives up after 10 one-second retries; keep waiting like flock
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _read_index():
+    """Get the parsed index, re-reading the file only when it changed"""
+    global _index
+    try:
+        mtime = os.stat(_index_path()).st_mtime_ns
+    except OSError:
+        return {}
+    if _index[0] != mtime:
+        try:
+            with open(_index_path(), "r") as f:
+                _index = (mtime, json.load(f))
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable history index: {str(e)}")
+            return {}
+    return _index[1]
+
+def _coverage(symbol):
+    """Date ranges already fetched for a symbol, as [start, end) pairs"""
+    return _read_index().get(symbol, {}).get("coverage", [])
+
+def _map_symbol(symbol):
+    """Memory-map a symbol's bar file, reusing the mapping while the file is unchanged"""
+    path = _symbol_path(symbol)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return _empty_window()
+
+    key = (stat.st_ino, stat.st_mtime_ns)
+    cached = _mapped.get(symbol)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    try:
+        raw = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(raw[:len(BAR_MAGIC)]) != BAR_MAGIC:
+            raise ValueError("unknown file format")
+        rows = int(np.frombuffer(raw, dtype=np.int64, count=1, offset=len(BAR_MAGIC))[0])
+        columns = [
+            np.frombuffer(raw, dtype=dtype, count=rows, offset=HEADER_SIZE + k * rows * 8)
+            for k, (_, dtype) in enumerate(BAR_COLUMNS)
+        ]
+        columns[0] = columns[0].view("datetime64[D]")
+        window = BarWindow(*columns)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable history file for {symbol}: {str(e)}")
+        return _empty_window()
+
+    _mapped[symbol] = (key, window)
+    return window
+
+def _write_symbol(symbol, window):
+    """Write a symbol's bars in the fixed layout and swap the file in atomically"""
+    os.makedirs(HISTORY_STORE_DIR, exist_ok=True)
+    path = _symbol_path(symbol)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+
+    header = bytearray(HEADER_SIZE)
+    header[:len(BAR_MAGIC)] = BAR_MAGIC
+    header[len(BAR_MAGIC):len(BAR_MAGIC) + 8] = np.int64(len(window)).tobytes()
+
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(window.date.astype("datetime64[D]").view(np.int64).tobytes())
+        for field, dtype in BAR_COLUMNS[1:]:
+            f.write(np.ascontiguousarray(getattr(window, field), dtype=dtype).tobytes())
+    # Readers that already mapped the old file keep its inode, so they never see a partial write
+    os.replace(tmp_path, path)
+
+def _load_index():
+    """Read index.json from disk; callers hold _index_file_lock()"""
+    try:
+        with open(_index_path(), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_index(index):
+    """Swap in a new index.json atomically; callers hold _index_file_lock()"""
+    tmp_path = f"{_index_path()}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, _index_path())
+
+def _merge_ranges(ranges):
+    """Merge overlapping or touching [start, end) ranges"""
+    merged = []
+    ranges = [(np.datetime64(start, "D"), np.datetime64(end, "D")) for start, end in ranges]
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def missing_ranges(coverage, start, end):
+    """
+    Get the parts of [start, end) not covered by the stored ranges
+
+    Args:
+        coverage: List of [start, end) pairs already fetched
+        start: First day wanted (datetime64[D])
+        end: Day after the last day wanted (datetime64[D])
+
+    Returns:
+        List of (start, end) tuples still to fetch
+    """
+    gaps = []
+    cursor = start
+    for covered_start, covered_end in _merge_ranges(coverage):
+        if covered_end <= cursor:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > cursor:
+            gaps.append((cursor, covered_start))
+        cursor = max(cursor, covered_end)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+def _frame_to_window(frame):
+    """Convert a downloaded DataFrame to bars, dropping empty rows"""
+    frame = frame.dropna(subset=["close"])
+    index = frame.index
+    if getattr(index, "tz", None) is not None:
+        index = index.tz_localize(None)
+    return BarWindow(
+        index.values.astype("datetime64[D]"),
+        frame["open"].to_numpy(dtype=np.float64),
+        frame["high"].to_numpy(dtype=np.float64),
+        frame["low"].to_numpy(dtype=np.float64),
+        frame["close"].to_numpy(dtype=np.float64),
+        frame["volume"].fillna(0).to_numpy(dtype=np.int64),
+    )
+
+def _merge_windows(stored, new):
+    """Merge newly fetched bars into stored ones; new values win on the same date"""
+    dates = np.concatenate([new.date, stored.date])
+    # np.unique keeps the first occurrence, so new bars take precedence
+    _, first = np.unique(dates, return_index=True)
+    return BarWindow(
+        dates[first],
+        *(np.concatenate([getattr(new, field), getattr(stored, field)])[first] for field in BAR_FIELDS)
+    )
+
+def get_history(symbols, start_date, end_date, fetch):
+    """
+    Get daily bars from the local store, fetching only missing date ranges
+
+    Symbols missing the same range are fetched together in one upstream
+    call. Ranges are only recorded as covered up to the previous exchange
+    day (New York time), so bars for the current session are always
+    re-fetched.
+
+    Args:
+        symbols: List of stock symbols
+        start_date: First day wanted
+        end_date: Day after the last day wanted
+        fetch: Function (symbols, start_date, end_date) -> dict of DataFrames
+            by symbol, e.g. get_yahoo_historical
+
+    Returns:
+        Dictionary of BarWindow by symbol; the arrays are read-only views
+        into the memory-mapped store
+    """
+    start, end = _as_day(start_date), _as_day(end_date)
+    last_final = _last_final_day()
+
+    # Group symbols by the ranges they are missing so each range is fetched once
+    with _store_lock:
+        groups = {}
+        for symbol in symbols:
+            for gap in missing_ranges(_coverage(symbol), start, end):
+                groups.setdefault(gap, []).append(symbol)
+
+    for (gap_start, gap_end), gap_symbols in groups.items():
+        logger.debug(f"History store: fetching {gap_start} to {gap_end} for {len(gap_symbols)} symbols")
+        frames = fetch(gap_symbols, gap_start.astype(datetime), gap_end.astype(datetime))
+        covered_end = min(gap_end, last_final)
+
+        # Hold the file lock from reading the stored bars to updating the
+        # index, so bars another worker stored meanwhile are merged, not lost
+        with _store_lock, _index_file_lock():
+            index = _load_index()
+            updated = False
+            for symbol in gap_symbols:
+                frame = frames.get(symbol)
+                new = _frame_to_window(frame) if frame is not None else _empty_window()
+
+                # Only trust an empty answer for ranges without trading days;
+                # otherwise it is more likely a failed download than no data
+                if len(new) == 0 and _has_trading_days(gap_start, gap_end):
+                    continue
+
+                merged = _merge_windows(_map_symbol(symbol), new)
+                coverage = list(index.get(symbol, {}).get("coverage", []))
+                if covered_end > gap_start:
+                    coverage.append((gap_start, covered_end))
+                try:
+                    _write_symbol(symbol, merged)
+                except Exception as e:
+                    logger.error(f"Error saving history for {symbol}: {str(e)}")
+                    continue
+                index[symbol] = {
+                    "rows": len(merged),
+                    "coverage": [[str(lo), str(hi)] for lo, hi in _merge_ranges(coverage)],
+                }
+                updated = True
+
+            if updated:
+                try:
+                    _save_index(index)
+                except Exception as e:
+                    logger.error(f"Error updating history index: {str(e)}")
+
+    with _store_lock:
+        windows = {symbol: _map_symbol(symbol).slice(start, end) for symbol in symbols}
+
+    return {symbol: window for symbol, window in windows.items() if len(window)}
@@ -0,0 +1,316 @@
+import os
+import json
+import time
+import logging
+from threading import Lock
+import yfinance as yf
+from utils.concurrency import fan_out
+
+# Configure module logger
+logger = logging.getLogger(__name__)
+
+# Location of the persisted metadata store
+METADATA_STORE_PATH = os.environ.get(
+    "METADATA_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "ticker_metadata.json")
+)
+
+# Time-to-live per metadata field in seconds. Descriptive fields rarely change,
+# market cap drifts with the price so it is refreshed daily.
+FIELD_TTLS = {
+    "name": 7 * 24 * 3600,
+    "sector": 7 * 24 * 3600,
+    "industry": 7 * 24 * 3600,
+    "marketCap": 24 * 3600,
+}
+
+# Maximum number of symbols refreshed by a single background run
+METADATA_REFRESH_BATCH = int(os.environ.get("METADATA_REFRESH_BATCH", 200))
+# Unknown symbols waiting for their first refresh; more are not queued, and a
+# symbol is given up on after this many refreshes without metadata
+METADATA_PENDING_MAX = int(os.environ.get("METADATA_PENDING_MAX", 1000))
+METADATA_PENDING_MAX_FAILURES = int(os.environ.get("METADATA_PENDING_MAX_FAILURES", 3))
+
+# Seed data for the metadata store, used until the background refresh fills in
+# values from Yahoo Finance (and kept when Yahoo has no sector/industry)
+DEFAULT_SECTORS = {
+    # Technology
+    "AAPL": {"sector": "TECHNOLOGY", "industry": "CONSUMER ELECTRONICS"},
+    "MSFT": {"sector": "TECHNOLOGY", "industry": "SOFTWARE"},
+    "GOOGL": {"sector": "TECHNOLOGY", "industry": "INTERNET CONTENT & INFORMATION"},
+    "AMZN": {"sector": "CONSUMER CYCLICAL", "industry": "INTERNET RETAIL"},
+    "META": {"sector": "TECHNOLOGY", "industry": "INTERNET CONTENT & INFORMATION"},
+    "TSLA": {"sector": "CONSUMER CYCLICAL", "industry": "AUTO MANUFACTURERS"},
+    "NVDA": {"sector": "TECHNOLOGY", "industry": "SEMICONDUCTORS"},
+    "INTC": {"sector": "TECHNOLOGY", "industry": "SEMICONDUCTORS"},
+    "AMD": {"sector": "TECHNOLOGY", "industry": "SEMICONDUCTORS"},
+    "CSCO": {"sector": "TECHNOLOGY", "industry": "COMMUNICATION EQUIPMENT"},
+    "IBM": {"sector": "TECHNOLOGY", "industry": "INFORMATION TECHNOLOGY SERVICES"},
+    "ORCL": {"sector": "TECHNOLOGY", "industry": "SOFTWARE"},
+    "ADBE": {"sector": "TECHNOLOGY", "industry": "SOFTWARE"},
+    "CRM": {"sector": "TECHNOLOGY", "industry": "SOFTWARE"},
+    "TXN": {"sector": "TECHNOLOGY", "industry": "SEMICONDUCTORS"},
+    "AVGO": {"sector": "TECHNOLOGY", "industry": "SEMICONDUCTORS"},
+    "QCOM": {"sector": "TECHNOLOGY", "industry": "SEMICONDUCTORS"},
+    "PYPL": {"sector": "FINANCIAL SERVICES", "industry": "CREDIT SERVICES"},
+    "NOW": {"sector": "TECHNOLOGY", "industry": "SOFTWARE"},
+    "SNOW": {"sector": "TECHNOLOGY", "industry": "DATA INFRASTRUCTURE"},
+    "ZS": {"sector": "TECHNOLOGY", "industry": "CYBERSECURITY"},
+    "PANW": {"sector": "TECHNOLOGY", "industry": "CYBERSECURITY"},
+    "MDB": {"sector": "TECHNOLOGY", "industry": "DATABASE MANAGEMENT"},
+    "TTD": {"sector": "TECHNOLOGY", "industry": "DIGITAL ADVERTISING"},
+    "DOCU": {"sector": "TECHNOLOGY", "industry": "CLOUD COMPUTING"},
+    "CRWD": {"sector": "TECHNOLOGY", "industry": "CYBERSECURITY"},
+    "PLTR": {"sector": "TECHNOLOGY", "industry": "BIG DATA"},
+    "SHOP": {"sector": "TECHNOLOGY", "industry": "E-COMMERCE"},
+    "SQ": {"sector": "TECHNOLOGY", "industry": "FINTECH"},
+    "DDOG": {"sector": "TECHNOLOGY", "industry": "CLOUD MONITORING"},
+    "NET": {"sector": "TECHNOLOGY", "industry": "CLOUD COMPUTING"},
+    "TWLO": {"sector": "TECHNOLOGY", "industry": "COMMUNICATION SERVICES"},
+    "U": {"sector": "TECHNOLOGY", "industry": "GAME DEVELOPMENT"},
+    "ROKU": {"sector": "TECHNOLOGY", "industry": "STREAMING MEDIA"},
+    
+    # Financials
+    "JPM": {"sector": "FINANCIAL SERVICES", "industry": "BANKS"},
+    "BAC": {"sector": "FINANCIAL SERVICES", "industry": "BANKS"},
+    "GS": {"sector": "FINANCIAL SERVICES", "industry": "CAPITAL MARKETS"},
+    "MS": {"sector": "FINANCIAL SERVICES", "industry": "CAPITAL MARKETS"},
+    "BLK": {"sector": "FINANCIAL SERVICES", "industry": "ASSET MANAGEMENT"},
+    "C": {"sector": "FINANCIAL SERVICES", "industry": "BANKS"},
+    "WFC": {"sector": "FINANCIAL SERVICES", "industry": "BANKS"},
+    "AXP": {"sector": "FINANCIAL SERVICES", "industry": "CREDIT SERVICES"},
+    "SCHW": {"sector": "FINANCIAL SERVICES", "industry": "BROKERAGE"},
+    "BRK.B": {"sector": "FINANCIAL SERVICES", "industry": "DIVERSIFIED FINANCIALS"},
+    
+    # Consumer Goods & Retail
+    "WMT": {"sector": "CONSUMER DEFENSIVE", "industry": "DISCOUNT STORES"},
+    "PG": {"sector": "CONSUMER DEFENSIVE", "industry": "HOUSEHOLD PRODUCTS"},
+    "KO": {"sector": "CONSUMER DEFENSIVE", "industry": "BEVERAGES"},
+    "PEP": {"sector": "CONSUMER DEFENSIVE", "industry": "BEVERAGES"},
+    "COST": {"sector": "CONSUMER DEFENSIVE", "industry": "DISCOUNT STORES"},
+    "MCD": {"sector": "CONSUMER CYCLICAL", "industry": "RESTAURANTS"},
+    "NKE": {"sector": "CONSUMER CYCLICAL", "industry": "FOOTWEAR & ACCESSORIES"},
+    "SBUX": {"sector": "CONSUMER CYCLICAL", "industry": "RESTAURANTS"},
+    "TGT": {"sector": "CONSUMER DEFENSIVE", "industry": "DEPARTMENT STORES"},
+    
+    # Healthcare
+    "JNJ": {"sector": "HEALTHCARE", "industry": "DRUG MANUFACTURERS"},
+    "PFE": {"sector": "HEALTHCARE", "industry": "DRUG MANUFACTURERS"},
+    "MRK": {"sector": "HEALTHCARE", "industry": "DRUG MANUFACTURERS"},
+    "LLY": {"sector": "HEALTHCARE", "industry": "DRUG MANUFACTURERS"},
+    "ABBV": {"sector": "HEALTHCARE", "industry": "DRUG MANUFACTURERS"},
+    "TMO": {"sector": "HEALTHCARE", "industry": "DIAGNOSTICS & RESEARCH"},
+    "ABT": {"sector": "HEALTHCARE", "industry": "MEDICAL DEVICES"},
+    "DHR": {"sector": "HEALTHCARE", "industry": "DIAGNOSTICS & RESEARCH"},
+    
+    # Industrials
+    "BA": {"sector": "INDUSTRIALS", "industry": "AEROSPACE & DEFENSE"},
+    "LMT": {"sector": "INDUSTRIALS", "industry": "AEROSPACE & DEFENSE"},
+    "CAT": {"sector": "INDUSTRIALS", "industry": "FARM & HEAVY CONSTRUCTION MACHINERY"},
+    "DE": {"sector": "INDUSTRIALS", "industry": "FARM & HEAVY CONSTRUCTION MACHINERY"},
+    "HON": {"sector": "INDUSTRIALS", "industry": "DIVERSIFIED INDUSTRIALS"},
+    "UPS": {"sector": "INDUSTRIALS", "industry": "INTEGRATED FREIGHT & LOGISTICS"},
+    
+    # Energy
+    "XOM": {"sector": "ENERGY", "industry": "OIL & GAS INTEGRATED"},
+    "CVX": {"sector": "ENERGY", "industry": "OIL & GAS INTEGRATED"},
+    "OXY": {"sector": "ENERGY", "industry": "OIL & GAS EXPLORATION"},
+    
+    # Communication & Media
+    "DIS": {"sector": "COMMUNICATION SERVICES", "industry": "ENTERTAINMENT"},
+    "NFLX": {"sector": "COMMUNICATION SERVICES", "industry": "ENTERTAINMENT"},
+    "CMCSA": {"sector": "COMMUNICATION SERVICES", "industry": "ENTERTAINMENT"},
+    "T": {"sector": "COMMUNICATION SERVICES", "industry": "TELECOM SERVICES"},
+    "VZ": {"sector": "COMMUNICATION SERVICES", "industry": "TELECOM SERVICES"},
+    "TMUS": {"sector": "COMMUNICATION SERVICES", "industry": "WIRELESS CARRIERS"},
+    
+    # Miscellaneous
+    "SPG": {"sector": "REAL ESTATE", "industry": "REITs"},
+    "PLD": {"sector": "REAL ESTATE", "industry": "REITs"},
+}
+
+# In-memory metadata store: symbol -> {field: (value, updated_at)}
+_metadata = {}
+# Symbols requested on the hot path that are not in the store yet -> failed refreshes
+_pending = {}
+_metadata_lock = Lock()
+
+def _empty_metadata():
+    return {"name": "", "sector": "OTHER", "industry": "OTHER", "marketCap": 0}
+
+def _seed_metadata():
+    """Add seed sector/industry values for symbols missing from the store"""
+    for symbol, defaults in DEFAULT_SECTORS.items():
+        entry = _metadata.setdefault(symbol, {})
+        for field in ("sector", "industry"):
+            # A timestamp of 0 marks the value as stale so it gets refreshed
+            entry.setdefault(field, (defaults[field], 0))
+
+def load_metadata_store(path=None):
+    """
+    Load the persisted metadata store from disk and merge in the seed data
+    
+    Args:
+        path: Store file path (default: METADATA_STORE_PATH)
+        
+    Returns:
+        Number of symbols in the store
+    """
+    path = path or METADATA_STORE_PATH
+    loaded = {}
+    
+    try:
+        with open(path, "r") as f:
+            raw = json.load(f)
+        for symbol, fields in raw.get("symbols", {}).items():
+            loaded[symbol] = {field: (value, updated_at) for field, (value, updated_at) in fields.items()}
+    except FileNotFoundError:
+        logger.info(f"No metadata store at {path}, starting from seed data")
+    except Exception as e:
+        logger.warning(f"Error loading metadata store from {path}: {str(e)}")
+    
+    with _metadata_lock:
+        _metadata.clear()
+        _metadata.update(loaded)
+        _seed_metadata()
+        count = len(_metadata)
+    
+    logger.info(f"Loaded ticker metadata for {count} symbols")
+    return count
+
+def save_metadata_store(path=None):
+    """
+    Persist the metadata store to disk
+    
+    Args:
+        path: Store file path (default: METADATA_STORE_PATH)
+    """
+    path = path or METADATA_STORE_PATH
+    
+    with _metadata_lock:
+        snapshot = {
+            symbol: {field: [value, updated_at] for field, (value, updated_at) in fields.items()}
+            for symbol, fields in _metadata.items()
+        }
+    
+    try:
+        # Write to a temporary file first so a crash never leaves a truncated store
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": 1, "symbols": snapshot}, f)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.error(f"Error saving metadata store to {path}: {str(e)}")
+
+def get_ticker_metadata(symbols):
+    """
+    Get name, sector, industry and market cap for symbols from memory
+    
+    Never calls upstream. Unknown symbols get placeholder values and are queued
+    for the next background refresh, up to METADATA_PENDING_MAX of them.
+    
+    Args:
+        symbols: List of stock symbols
+        
+    Returns:
+        Dictionary of metadata by symbol
+    """
+    result = {}
+    
+    with _metadata_lock:
+        for symbol in symbols:
+            entry = _metadata.get(symbol)
+            if entry is None:
+                if symbol not in _pending and len(_pending) < METADATA_PENDING_MAX:
+                    _pending[symbol] = 0
+                result[symbol] = _empty_metadata()
+                continue
+            
+            metadata = _empty_metadata()
+            for field, (value, _) in entry.items():
+                if value:
+                    metadata[field] = value
+            if "industry" not in entry or not entry["industry"][0]:
+                metadata["industry"] = metadata["sector"]
+            result[symbol] = metadata
+    
+    return result
+
+def _fetch_ticker_info(symbol):
+    """Fetch metadata fields for a single symbol from Yahoo Finance"""
+    info = yf.Ticker(symbol).info
+    sector = info.get("sector", "")
+    industry = info.get("industry", "")
+    
+    return {
+        "name": info.get("shortName", ""),
+        "sector": sector.upper() if sector else "",
+        "industry": industry.upper() if industry else "",
+        "marketCap": info.get("marketCap", 0) or 0
+    }
+
+def _stale_symbols(candidates, now):
+    """Return the candidate symbols with at least one missing or expired field"""
+    stale = []
+    with _metadata_lock:
+        for symbol in candidates:
+            entry = _metadata.get(symbol, {})
+            for field, ttl in FIELD_TTLS.items():
+                if field not in entry or now - entry[field][1] >= ttl:
+                    stale.append(symbol)
+                    break
+    return stale
+
+def refresh_ticker_metadata(symbols=None):
+    """
+    Refresh stale metadata in bulk - called by scheduler
+    
+    Args:
+        symbols: Additional symbols to keep in the store (optional)
+        
+    Returns:
+        Number of symbols refreshed
+    """
+    with _metadata_lock:
+        candidates = set(_metadata) | set(_pending)
+    candidates.update(symbols or [])
+    
+    now = time.time()
+    stale = sorted(_stale_symbols(candidates, now))[:METADATA_REFRESH_BATCH]
+    if not stale:
+        return 0
+    
+    logger.info(f"Refreshing ticker metadata for {len(stale)} symbols")
+    
+    updates = {}
+    failed = []
+    for symbol, info, error in fan_out(_fetch_ticker_info, stale, provider="yahoo"):
+        if error is not None:
+            logger.warning(f"Error fetching detailed info for {symbol}: {str(error)}")
+            failed.append(symbol)
+        else:
+            updates[symbol] = info
+    
+    with _metadata_lock:
+        # A queued symbol Yahoo knows nothing about failed as well
+        failed.extend(symbol for symbol in _pending if symbol in updates and not any(updates[symbol].values()))
+        for symbol in failed:
+            if symbol in _pending:
+                updates.pop(symbol, None)
+                _pending[symbol] += 1
+                if _pending[symbol] >= METADATA_PENDING_MAX_FAILURES:
+                    logger.info(f"Giving up on metadata for {symbol} after {_pending[symbol]} refreshes")
+                    del _pending[symbol]
+        for symbol, fields in updates.items():
+            entry = _metadata.setdefault(symbol, {})
+            for field, value in fields.items():
+                # Keep existing (e.g. seed) values when Yahoo has nothing for a field
+                if value or field not in entry:
+                    entry[field] = (value, now)
+                else:
+                    entry[field] = (entry[field][0], now)
+            _pending.pop(symbol, None)
+    
+    save_metadata_store()
+    logger.info(f"Ticker metadata refreshed for {len(updates)} of {len(stale)} symbols")
+    return len(updates)
@@ -1,65 +1,111 @@
 import logging
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from collections import defaultdict
+from data.snapshot import MarketSnapshot, palette_colors, to_numeric
+from data.history_store import BarWindow
 
 # Configure module logger
 logger = logging.getLogger(__name__)
 
+def top_indices(values, limit=None):
+    """
+    Positions of the largest values, largest first
+    
+    Gives the same result as np.argsort(-values, kind="stable")[:limit], ties
+    in input order, but with a limit only the rows that can make the cut are
+    sorted: a partition finds the limit-th largest value in linear time.
+    
+    Args:
+        values: float64 array without NaN
+        limit: Number of positions to return (optional, all if None)
+        
+    Returns:
+        Integer array of positions
+    """
+    if limit is None or limit >= len(values):
+        return np.argsort(-values, kind="stable")
+    if limit <= 0:
+        return np.array([], dtype=np.int64)
+    cutoff = -np.partition(-values, limit - 1)[limit - 1]
+    candidates = np.flatnonzero(values >= cutoff)
+    return candidates[np.argsort(-values[candidates], kind="stable")[:limit]]
+
+def _stock_layout(snapshot):
+    """
+    Compute the heat map ordering, colour intensity and tile size of every stock
+
+    Args:
+        snapshot: MarketSnapshot
+
+    Returns:
+        Tuple of (order, normalized_change, intensity, sizes); all but order
+        are already in display order, sizes is None when there is no volume
+    """
+    change_percent = snapshot.change_percent
+    
+    # Sort by change percentage (stable, largest first)
+    order = np.argsort(-change_percent, kind="stable")
+    
+    # Find max values for normalization
+    max_change = np.abs(change_percent).max()
+    max_volume = snapshot.volume.max()
+    
+    # Normalize change_percent to a -1 to 1 scale
+    if max_change > 0:
+        normalized_change = change_percent[order] / max_change
+    else:
+        normalized_change = np.zeros(len(order))
+    
+    # Intensity based on absolute change percentage
+    intensity = np.minimum(255, (np.abs(normalized_change) * 255).astype(np.int64))
+    
+    # Normalize volume for size
+    sizes = (snapshot.volume[order] / max_volume) * 2 + 0.5 if max_volume > 0 else None
+    
+    return order, normalized_change, intensity, sizes
+
 def process_stock_data(data):
     """
     Process stock data for heat map visualization
     
     Args:
-        data: List of stock data dictionaries
+        data: List of stock data dictionaries or a MarketSnapshot
         
     Returns:
         Dictionary with processed data for heatmap visualization
     """
     try:
-        if not data:
+        if data is None or len(data) == 0:
             return {"items": [], "timestamp": datetime.now().isoformat()}
         
-        # Sort by change percentage
-        sorted_data = sorted(data, key=lambda x: x.get('change_percent', 0), reverse=True)
-        
-        # Process for heatmap - adding color and size values
-        processed_items = []
+        snapshot = data if isinstance(data, MarketSnapshot) else MarketSnapshot.from_items(data)
+        order, normalized_change, intensity, sizes = _stock_layout(snapshot)
+        colors = palette_colors(normalized_change, intensity)
+        sizes = sizes.tolist() if sizes is not None else [1] * len(order)
         
-        # Find min and max values for normalization
-        max_change = max(abs(item.get('change_percent', 0)) for item in data)
-        max_volume = max(item.get('volume', 0) for item in data)
-        
-        for item in sorted_data:
-            # Normalize change_percent to a -1 to 1 scale
-            normalized_change = item.get('change_percent', 0) / max_change if max_change > 0 else 0
-            
-            # Determine color (red for negative, green for positive)
-            color = "rgb(255, 0, 0)" if normalized_change < 0 else "rgb(0, 128, 0)"
-            
-            # Calculate intensity based on absolute change percentage
-            intensity = min(255, int(abs(normalized_change) * 255))
-            
-            if normalized_change < 0:
-                color = f"rgba(255, {255-intensity}, {255-intensity}, 1)"
-            else:
-                color = f"rgba({255-intensity}, 255, {255-intensity}, 1)"
-                
-            # Normalize volume for size
-            size = 1
-            if max_volume > 0:
-                size = (item.get('volume', 0) / max_volume) * 2 + 0.5
-                
-            processed_items.append({
-                "symbol": item.get('symbol', ''),
-                "price": item.get('price', 0),
-                "change": item.get('change', 0),
-                "change_percent": item.get('change_percent', 0),
-                "volume": item.get('volume', 0),
+        raw_change_percent = snapshot.raw["change_percent"][order]
+        processed_items = [
+            {
+                "symbol": symbol,
+                "price": price,
+                "change": change,
+                "change_percent": pct,
+                "volume": volume,
                 "color": color,
                 "size": size,
-                "value": abs(item.get('change_percent', 0))
-            })
+                "value": abs(pct)
+            }
+            for symbol, price, change, pct, volume, color, size in zip(
+                snapshot.raw["symbol"][order].tolist(),
+                snapshot.raw["price"][order].tolist(),
+                snapshot.raw["change"][order].tolist(),
+                raw_change_percent.tolist(),
+                snapshot.raw["volume"][order].tolist(),
+                colors.tolist(),
+                sizes
+            )
+        ]
             
         return {
             "items": processed_items,
@@ -69,12 +115,76 @@ def process_stock_data(data):
         logger.error(f"Error processing stock data: {str(e)}")
         return {"items": [], "timestamp": datetime.now().isoformat(), "error": str(e)}
 
-def process_historical_data(data):
+def stock_columns(data):
+    """
+    Process stock data into typed columns for binary encodings
+    
+    Rows are in the same order as process_stock_data. Instead of an rgba()
+    string each stock has a signed "heat" in -255..255: the palette intensity,
+    negative for falling stocks (see data.snapshot.palette_colors).
+    
+    Args:
+        data: List of stock data dictionaries or a MarketSnapshot
+        
+    Returns:
+        Columnar payload dictionary with "columns", "dictionaries" and "metadata"
+    """
+    snapshot = data if isinstance(data, MarketSnapshot) else MarketSnapshot.from_items(data or [])
+    metadata = {"timestamp": datetime.now().isoformat()}
+    
+    if len(snapshot) == 0:
+        order = np.array([], dtype=np.int64)
+        heat = np.array([], dtype=np.int16)
+        sizes = np.array([], dtype=np.float64)
+    else:
+        order, normalized_change, intensity, sizes = _stock_layout(snapshot)
+        heat = np.where(normalized_change >= 0, intensity, -intensity).astype(np.int16)
+        sizes = sizes if sizes is not None else np.ones(len(order))
+    
+    columns = {
+        "symbol": snapshot.raw["symbol"][order],
+        "price": to_numeric(snapshot.raw["price"][order]),
+        "change": to_numeric(snapshot.raw["change"][order]),
+        "change_percent": snapshot.change_percent[order],
+        "volume": snapshot.volume[order].astype(np.int64),
+        "heat": heat,
+        "size": sizes,
+    }
+    return {"columns": columns, "dictionaries": {}, "metadata": metadata}
+
+def _history_arrays(history):
+    """
+    Get date, close and volume arrays for one symbol's history
+    
+    Args:
+        history: BarWindow from the history store, DataFrame indexed by
+            date, or a list of daily records with a "date" key (the previous
+            row-oriented format)
+        
+    Returns:
+        Tuple of (dates, closes, volumes) NumPy arrays
+    """
+    if isinstance(history, BarWindow):
+        return np.datetime_as_string(history.date, unit='D').astype(object), history.close, history.volume
+    frame = history if isinstance(history, pd.DataFrame) else pd.DataFrame(history)
+    if "date" in frame.columns:
+        dates = frame["date"].to_numpy(dtype=object)
+    else:
+        dates = frame.index.strftime('%Y-%m-%d').to_numpy(dtype=object)
+    return dates, frame["close"].to_numpy(dtype=np.float64), frame["volume"].to_numpy()
+
+def process_historical_data(data, orient="records"):
     """
     Process historical stock data for visualization
     
+    Daily changes and stats are computed for all symbols at once on
+    concatenated arrays; output dicts or lists are only built at the end.
+    
     Args:
-        data: Dictionary of historical data by symbol
+        data: Dictionary of historical data by symbol (BarWindows, DataFrames
+            or lists of records)
+        orient: "records" for one dict per day (default), "columns" for one
+            array per field
         
     Returns:
         Processed historical data ready for visualization
@@ -82,40 +192,76 @@ def process_historical_data(data):
     try:
         result = {"symbols": {}, "timestamp": datetime.now().isoformat()}
         
+        symbols, dates, closes, volumes = [], [], [], []
         for symbol, history in data.items():
-            if not history:
+            # At least two days are needed for a daily change
+            if history is None or len(history) < 2:
                 continue
-                
-            # Calculate daily changes
-            changes = []
-            for i in range(1, len(history)):
-                prev_close = history[i-1].get('close', 0)
-                if prev_close > 0:
-                    pct_change = ((history[i].get('close', 0) - prev_close) / prev_close) * 100
-                else:
-                    pct_change = 0
-                
-                changes.append({
-                    "date": history[i].get('date'),
-                    "change_percent": pct_change,
-                    "close": history[i].get('close'),
-                    "volume": history[i].get('volume')
-                })
+            symbol_dates, symbol_closes, symbol_volumes = _history_arrays(history)
+            symbols.append(symbol)
+            dates.append(symbol_dates)
+            closes.append(symbol_closes)
+            volumes.append(symbol_volumes)
+        
+        if not symbols:
+            return result
+        
+        lengths = np.array([len(c) for c in closes])
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        close = np.concatenate(closes)
+        
+        # Previous close for every row; the first row of each symbol has none
+        prev_close = np.empty_like(close)
+        prev_close[1:] = close[:-1]
+        prev_close[starts] = np.nan
+        
+        # Calculate daily changes
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change = np.where(prev_close > 0, ((close - prev_close) / prev_close) * 100, 0.0)
+        
+        keep = np.ones(len(close), dtype=bool)
+        keep[starts] = False
+        change = change[keep]
+        close = close[keep]
+        date = np.concatenate(dates)[keep]
+        volume = np.concatenate(volumes)[keep]
+        
+        # Calculate metrics per symbol in one pass over the segments
+        segment_starts = starts - np.arange(len(starts))
+        valid = ~np.isnan(change)
+        max_change = np.fmax.reduceat(change, segment_starts)
+        min_change = np.fmin.reduceat(change, segment_starts)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            avg_change = (np.add.reduceat(np.where(valid, change, 0.0), segment_starts)
+                          / np.add.reduceat(valid, segment_starts))
+        
+        segment_ends = np.append(segment_starts[1:], len(change))
+        for i, symbol in enumerate(symbols):
+            start, end = segment_starts[i], segment_ends[i]
+            columns = {
+                "date": date[start:end].tolist(),
+                "change_percent": change[start:end].tolist(),
+                "close": close[start:end].tolist(),
+                "volume": volume[start:end].tolist()
+            }
+            
+            if orient == "columns":
+                history = columns
+            else:
+                history = [
+                    {"date": d, "change_percent": c, "close": p, "volume": v}
+                    for d, c, p, v in zip(columns["date"], columns["change_percent"],
+                                          columns["close"], columns["volume"])
+                ]
             
-            # Calculate metrics
-            if changes:
-                max_change = max(item["change_percent"] for item in changes)
-                min_change = min(item["change_percent"] for item in changes)
-                avg_change = sum(item["change_percent"] for item in changes) / len(changes)
-                
-                result["symbols"][symbol] = {
-                    "history": changes,
-                    "stats": {
-                        "max_change": max_change,
-                        "min_change": min_change,
-                        "avg_change": avg_change
-                    }
+            result["symbols"][symbol] = {
+                "history": history,
+                "stats": {
+                    "max_change": float(max_change[i]),
+                    "min_change": float(min_change[i]),
+                    "avg_change": float(avg_change[i])
                 }
+            }
         
         return result
     except Exception as e:
@@ -129,7 +275,7 @@ def process_sector_data(data, sector=None, limit=None):
     Args:
         data: List of sector performance dictionaries
         sector: Filter by specific sector (optional)
-        limit: Limit number of results (optional)
+        limit: Only return the sectors with the largest absolute change (optional)
         
     Returns:
         Dictionary with processed sector data for heatmap visualization
@@ -138,46 +284,42 @@ def process_sector_data(data, sector=None, limit=None):
         if not data:
             return {"sectors": [], "timestamp": datetime.now().isoformat()}
         
+        names = pd.Series([item.get('sector', '') for item in data], dtype=object)
+        
         # Filter by sector if specified
         if sector:
-            filtered_data = [item for item in data if sector.lower() in item.get('sector', '').lower()]
+            mask = names.str.lower().str.contains(sector.lower(), regex=False).fillna(False).to_numpy(dtype=bool)
+            indices = np.flatnonzero(mask)
         else:
-            filtered_data = data
+            indices = np.arange(len(data))
         
-        # Apply limit if specified
-        if limit:
-            filtered_data = filtered_data[:limit]
+        if len(indices) == 0:
+            return {"sectors": [], "timestamp": datetime.now().isoformat()}
         
-        # Process for heatmap
-        processed_sectors = []
+        # Parse "1.23%" strings; unparseable values count as 0
+        percent_strings = pd.Series([data[i].get('changesPercentage', '0%') for i in indices], dtype=object)
+        parsed = pd.to_numeric(percent_strings.str.replace('%', '', regex=False), errors="coerce")
+        valid = parsed.notna().to_numpy()
+        change_percent = parsed.fillna(0).to_numpy(dtype=np.float64)
         
-        for item in filtered_data:
-            sector_name = item.get('sector', '')
-            change_percent_str = item.get('changesPercentage', '0%').replace('%', '')
-            
-            try:
-                change_percent = float(change_percent_str)
-            except ValueError:
-                change_percent = 0
-            
-            # Determine color (red for negative, green for positive)
-            if change_percent < 0:
-                intensity = min(255, int(abs(change_percent) * 20))
-                color = f"rgba(255, {255-intensity}, {255-intensity}, 1)"
-            else:
-                intensity = min(255, int(abs(change_percent) * 20))
-                color = f"rgba({255-intensity}, 255, {255-intensity}, 1)"
-                
+        # Determine color (red for negative, green for positive)
+        intensity = np.minimum(255, (np.abs(change_percent) * 20).astype(np.int64))
+        colors = palette_colors(change_percent, intensity)
+        
+        # Order by absolute change percentage (stable, largest first)
+        order = top_indices(np.abs(change_percent), limit or None)
+        
+        sector_names = names.to_numpy()[indices]
+        processed_sectors = []
+        for i in order.tolist():
+            value = float(change_percent[i]) if valid[i] else 0
             processed_sectors.append({
-                "name": sector_name,
-                "change_percent": change_percent,
-                "color": color,
-                "value": abs(change_percent)
+                "name": sector_names[i],
+                "change_percent": value,
+                "color": colors[i],
+                "value": abs(value)
             })
             
-        # Sort by absolute change percentage
-        processed_sectors = sorted(processed_sectors, key=lambda x: abs(x["change_percent"]), reverse=True)
-            
         return {
             "sectors": processed_sectors,
             "timestamp": datetime.now().isoformat()
@@ -186,83 +328,138 @@ def process_sector_data(data, sector=None, limit=None):
         logger.error(f"Error processing sector data: {str(e)}")
         return {"sectors": [], "timestamp": datetime.now().isoformat(), "error": str(e)}
 
-def process_stocks_by_sector(stock_data, large_cap_threshold=100000000000):
+def _top_in_sector(rows, market_cap, abs_change, limit):
+    """
+    The first `limit` rows of one sector in display order
+    
+    Only rows whose market cap reaches the limit-th largest one can be shown,
+    so just those are sorted.
+    """
+    if len(rows) > limit:
+        cutoff = -np.partition(-market_cap[rows], limit - 1)[limit - 1]
+        rows = rows[market_cap[rows] >= cutoff]
+    return rows[np.lexsort((-abs_change[rows], -market_cap[rows]))][:limit]
+
+def _sector_layout(snapshot, large_cap_threshold, limit=None):
+    """
+    Order stocks for the sector heat map
+    
+    Args:
+        snapshot: MarketSnapshot
+        large_cap_threshold: Market cap threshold for the isLarge flag
+        limit: Maximum number of stocks per sector (optional)
+        
+    Returns:
+        Tuple of (snapshot without unnamed stocks, sector_order, sector_counts,
+        order, is_large); order lists rows sector by sector, sector_order the
+        sector codes in display order and sector_counts the rows per sector
+    """
+    # Skip stocks with no symbol
+    has_symbol = np.array([bool(symbol) for symbol in snapshot.raw["symbol"].tolist()], dtype=bool)
+    if not has_symbol.all():
+        snapshot = snapshot.take(np.flatnonzero(has_symbol))
+    
+    if len(snapshot) == 0:
+        return snapshot, None, None, None, None
+    
+    # Sectors with more stocks come first, ties keep order of first appearance
+    sector_counts = np.bincount(snapshot.sector_codes)
+    sector_order = np.argsort(-sector_counts, kind="stable")
+    
+    if limit is None:
+        sector_rank = np.empty_like(sector_order)
+        sector_rank[sector_order] = np.arange(len(sector_order))
+        
+        # Within a sector sort stocks by market cap (larger first) and then by
+        # change (absolute value); lexsort is stable so ties keep input order
+        order = np.lexsort((
+            -np.abs(snapshot.change_percent),
+            -snapshot.market_cap,
+            sector_rank[snapshot.sector_codes]
+        ))
+    else:
+        # Same order, but only the top rows of each sector are selected and sorted
+        abs_change = np.abs(snapshot.change_percent)
+        limit = max(limit, 0)
+        order = np.concatenate([
+            _top_in_sector(np.flatnonzero(snapshot.sector_codes == code), snapshot.market_cap, abs_change, limit)
+            for code in sector_order.tolist()
+        ])
+        sector_counts = np.minimum(sector_counts, limit)
+    
+    # Determine if each stock is a large-cap stock
+    is_large = (snapshot.market_cap >= large_cap_threshold) & (snapshot.market_cap != 0)
+    
+    return snapshot, sector_order, sector_counts, order, is_large
+
+def _as_snapshot(stock_data):
+    """Get a MarketSnapshot from a snapshot or a dictionary with "items", None if invalid"""
+    if isinstance(stock_data, MarketSnapshot):
+        return stock_data
+    if not stock_data or not isinstance(stock_data, dict) or "items" not in stock_data:
+        logger.error("Invalid stock data format")
+        return None
+    return MarketSnapshot.from_items(stock_data.get("items", []))
+
+def process_stocks_by_sector(stock_data, large_cap_threshold=100000000000, limit=None):
     """
     Group stock data by sectors for heatmap visualization
     
     Args:
-        stock_data: List of stock data dictionaries
+        stock_data: Dictionary with a list of stock data dictionaries under
+            "items", or a MarketSnapshot
         large_cap_threshold: Market cap threshold for isLarge flag (default: $100B)
+        limit: Maximum number of stocks per sector, the largest ones (optional)
         
     Returns:
         List of sector data with stocks grouped by sector
     """
     try:
-        if not stock_data or not isinstance(stock_data, dict) or "items" not in stock_data:
-            logger.error("Invalid stock data format")
+        snapshot = _as_snapshot(stock_data)
+        if snapshot is None:
             return []
-            
-        # Group stocks by sector
-        sector_map = defaultdict(list)
         
-        for stock in stock_data.get("items", []):
-            # Skip stocks with no symbol
-            if not stock.get("symbol"):
-                continue
-                
-            # Extract sector and industry data properly
-            sector = stock.get("sector", "").upper() if stock.get("sector") else "OTHER"
-            industry = stock.get("industry", "").upper() if stock.get("industry") else sector
-            
-            # For logging/debug purposes
-            if sector == "OTHER" and industry == "OTHER":
-                logger.debug(f"Missing sector info for {stock.get('symbol')}")
-            
-            # Determine if this is a large-cap stock
-            market_cap = stock.get("marketCap", 0)
-            is_large = market_cap >= large_cap_threshold if market_cap else False
-            
-            # Create stock entry in the format needed for the heatmap
-            stock_entry = {
-                "ticker": stock.get("symbol", ""),
-                "name": stock.get("name", ""),
-                "price": stock.get("price", 0),
-                "change": stock.get("change_percent", 0),
+        snapshot, sector_order, sector_counts, order, is_large = _sector_layout(snapshot, large_cap_threshold, limit)
+        
+        # If we have no sectors with data, log an error
+        if len(snapshot) == 0:
+            logger.error("No sector data available for any stock")
+            logger.debug("Processed 0 sectors: []")
+            return []
+        
+        stocks = [
+            {
+                "ticker": ticker,
+                "name": name,
+                "price": price,
+                "change": change,
                 "marketCap": market_cap,
                 "sector": sector,  # Use actual sector for grouping
                 "industry": industry,
-                "isLarge": is_large
+                "isLarge": large
             }
-            
-            # Add to the appropriate sector
-            sector_map[sector].append(stock_entry)
+            for ticker, name, price, change, market_cap, sector, industry, large in zip(
+                snapshot.raw["symbol"][order].tolist(),
+                snapshot.raw["name"][order].tolist(),
+                snapshot.raw["price"][order].tolist(),
+                snapshot.raw["change_percent"][order].tolist(),
+                snapshot.raw["marketCap"][order].tolist(),
+                snapshot.sector_names()[order].tolist(),
+                snapshot.industry_names()[order].tolist(),
+                is_large[order].tolist()
+            )
+        ]
         
-        # If we have no sectors with data, log an error
-        if not sector_map:
-            logger.error("No sector data available for any stock")
-            
-        # Create the final structure
+        # Create the final structure, one slice of the sorted stocks per sector
         result = []
-        for sector_name, stocks in sector_map.items():
-            # Skip empty sectors
-            if not stocks:
-                continue
-                
-            # Sort stocks by market cap (larger first) and then by change (absolute value)
-            sorted_stocks = sorted(
-                stocks, 
-                key=lambda x: (x.get("marketCap", 0) or 0, abs(x.get("change", 0) or 0)), 
-                reverse=True
-            )
-            
-            # Add sector to result
+        start = 0
+        for code in sector_order.tolist():
+            end = start + int(sector_counts[code])
             result.append({
-                "name": sector_name,
-                "stocks": sorted_stocks
+                "name": snapshot.sectors[code],
+                "stocks": stocks[start:end]
             })
-        
-        # Sort sectors by number of stocks (more stocks first)
-        result = sorted(result, key=lambda x: len(x["stocks"]), reverse=True)
+            start = end
         
         # Log the sectors we found
         logger.debug(f"Processed {len(result)} sectors: {[s['name'] for s in result]}")
@@ -271,3 +468,149 @@ def process_stocks_by_sector(stock_data, large_cap_threshold=100000000000):
     except Exception as e:
         logger.error(f"Error processing stocks by sector: {str(e)}")
         return []
+
+def process_sector_delta(delta, large_cap_threshold=100000000000):
+    """
+    Turn a snapshot delta into heat map tiles
+    
+    Args:
+        delta: Dictionary from data.versions.snapshot_delta
+        large_cap_threshold: Market cap threshold for isLarge flag (default: $100B)
+        
+    Returns:
+        Dictionary with the changed tiles as a flat list and the removed symbols
+    """
+    sectors = process_stocks_by_sector({"items": delta["changed"]}, large_cap_threshold=large_cap_threshold)
+    return {
+        "version": delta["version"],
+        "since": delta["since"],
+        "changed": [stock for sector in sectors for stock in sector["stocks"]],
+        "removed": delta["removed"],
+        "timestamp": datetime.now().isoformat()
+    }
+
+def stocks_by_sector_columns(stock_data, large_cap_threshold=100000000000, limit=None):
+    """
+    Group stock data by sectors as typed columns for binary encodings
+    
+    Rows are in the same order as the flattened process_stocks_by_sector
+    output. "sector" and "industry" hold codes into the sector and industry
+    dictionaries; sectors are listed in display order, so the rows of each
+    sector are contiguous.
+    
+    Args:
+        stock_data: Dictionary with a list of stock data dictionaries under
+            "items", or a MarketSnapshot
+        large_cap_threshold: Market cap threshold for isLarge flag (default: $100B)
+        limit: Maximum number of stocks per sector, the largest ones (optional)
+        
+    Returns:
+        Columnar payload dictionary with "columns", "dictionaries" and "metadata"
+    """
+    snapshot = _as_snapshot(stock_data) or MarketSnapshot.from_items([])
+    snapshot, sector_order, _, order, is_large = _sector_layout(snapshot, large_cap_threshold, limit)
+    metadata = {"timestamp": datetime.now().isoformat()}
+    
+    if len(snapshot) == 0:
+        order = np.array([], dtype=np.int64)
+        sector_order = np.array([], dtype=np.int64)
+        is_large = np.array([], dtype=bool)
+    
+    # Renumber sectors so that code i is the i-th sector shown
+    sector_rank = np.empty(len(sector_order), dtype=np.int32)
+    sector_rank[sector_order] = np.arange(len(sector_order), dtype=np.int32)
+    
+    columns = {
+        "ticker": snapshot.raw["symbol"][order],
+        "name": snapshot.raw["name"][order],
+        "price": to_numeric(snapshot.raw["price"][order]),
+        "change": snapshot.change_percent[order],
+        "marketCap": snapshot.market_cap[order],
+        "sector": sector_rank[snapshot.sector_codes[order]],
+        "industry": snapshot.industry_codes[order].astype(np.int32),
+        "isLarge": is_large[order],
+    }
+    dictionaries = {
+        "sector": np.asarray(snapshot.sectors, dtype=object)[sector_order].tolist(),
+        "industry": np.asarray(snapshot.industries, dtype=object).tolist(),
+    }
+    return {"columns": columns, "dictionaries": dictionaries, "metadata": metadata}
+
+def _movers(snapshot, rows, limit):
+    """Gainers and losers among the given rows of a snapshot"""
+    change_percent = snapshot.change_percent[rows]
+    
+    # Largest rises and largest falls; stocks that did not move are in neither
+    gainers = rows[top_indices(change_percent, limit)]
+    gainers = gainers[snapshot.change_percent[gainers] > 0]
+    losers = rows[top_indices(-change_percent, limit)]
+    losers = losers[snapshot.change_percent[losers] < 0]
+    
+    sector_names = snapshot.sector_names()
+    
+    def items(order):
+        return [
+            {
+                "symbol": symbol,
+                "name": name,
+                "price": price,
+                "change": change,
+                "change_percent": pct,
+                "marketCap": market_cap,
+                "sector": sector
+            }
+            for symbol, name, price, change, pct, market_cap, sector in zip(
+                snapshot.raw["symbol"][order].tolist(),
+                snapshot.raw["name"][order].tolist(),
+                snapshot.raw["price"][order].tolist(),
+                snapshot.raw["change"][order].tolist(),
+                snapshot.raw["change_percent"][order].tolist(),
+                snapshot.raw["marketCap"][order].tolist(),
+                sector_names[order].tolist()
+            )
+        ]
+    
+    return {"gainers": items(gainers), "losers": items(losers)}
+
+def process_movers(data, limit=10, sector=None):
+    """
+    Get the top gainers and losers by change percentage
+    
+    Selection uses a partition over the change column, so only the stocks
+    that make the cut are sorted.
+    
+    Args:
+        data: List of stock data dictionaries or a MarketSnapshot
+        limit: Number of gainers and of losers (default: 10)
+        sector: Only stocks of this sector (optional)
+        
+    Returns:
+        Dictionary with "gainers" (largest rise first) and "losers" (largest
+        fall first)
+    """
+    snapshot = data if isinstance(data, MarketSnapshot) else MarketSnapshot.from_items(data or [])
+    
+    if sector:
+        codes = np.flatnonzero(np.asarray(snapshot.sectors, dtype=object) == sector.upper())
+        rows = np.flatnonzero(np.isin(snapshot.sector_codes, codes))
+    else:
+        rows = np.arange(len(snapshot))
+    
+    return _movers(snapshot, rows, limit)
+
+def process_sector_movers(data, limit=10):
+    """
+    Get the top gainers and losers of every sector in one pass
+    
+    Args:
+        data: List of stock data dictionaries or a MarketSnapshot
+        limit: Number of gainers and of losers per sector (default: 10)
+        
+    Returns:
+        Dictionary of normalized sector name to process_movers output
+    """
+    snapshot = data if isinstance(data, MarketSnapshot) else MarketSnapshot.from_items(data or [])
+    return {
+        name: _movers(snapshot, np.flatnonzero(snapshot.sector_codes == code), limit)
+        for code, name in enumerate(snapshot.sectors)
+    }
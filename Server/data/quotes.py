@@ -0,0 +1,191 @@
+import os
+import time
+import heapq
+import logging
+from threading import Lock
+from utils.market_hours import market_session
+
+# Configure module logger
+logger = logging.getLogger(__name__)
+
+# How long a quote is reused before it is fetched again, in seconds
+QUOTE_TTL = int(os.environ.get("QUOTE_TTL", 300))
+# Outside regular trading hours prices barely move, so quotes are kept longer
+QUOTE_TTLS = {
+    "regular": QUOTE_TTL,
+    "extended": int(os.environ.get("QUOTE_TTL_EXTENDED", 1800)),
+    "closed": int(os.environ.get("QUOTE_TTL_CLOSED", 6 * 3600)),
+}
+# How long a symbol that returned no data is not asked for again
+QUOTE_MISS_TTL = int(os.environ.get("QUOTE_MISS_TTL", 60))
+# Upper bound on stored symbols; the oldest quotes are dropped first
+QUOTE_STORE_MAX_SYMBOLS = int(os.environ.get("QUOTE_STORE_MAX_SYMBOLS", 5000))
+
+# Half-life of request counts used to find frequently requested symbols, in seconds
+DEMAND_HALF_LIFE = int(os.environ.get("DEMAND_HALF_LIFE", 3600))
+
+# Per-symbol quote store: symbol -> (fetched_at, quote or None for a miss)
+_quotes = {}
+# Last quote received per symbol, kept when a later fetch misses it
+_last_known = {}
+_quotes_lock = Lock()
+
+# Decaying request counts by symbol, and when they were last decayed; only
+# symbols with a last known quote are counted, so this stays within the store size
+_demand = {}
+_demand_decayed_at = time.time()
+
+def normalize_symbols(symbols):
+    """
+    Normalize a symbol list so equivalent requests share cache entries
+
+    Args:
+        symbols: Comma-separated string or list of stock symbols
+
+    Returns:
+        Sorted list of unique, upper-cased symbols
+    """
+    if isinstance(symbols, str):
+        symbols = symbols.split(",")
+    return sorted({s.strip().upper() for s in symbols if s and s.strip()})
+
+def lookup_quotes(symbols, max_age=None):
+    """
+    Split symbols into those with a usable stored quote and those to fetch
+
+    Args:
+        symbols: List of stock symbols
+        max_age: Maximum quote age in seconds (default: QUOTE_TTLS for
+            the current market session)
+
+    Returns:
+        Tuple of (dict of quotes by symbol, list of symbols to fetch)
+    """
+    max_age = QUOTE_TTLS[market_session()] if max_age is None else max_age
+    now = time.time()
+    found = {}
+    missing = []
+
+    with _quotes_lock:
+        for symbol in symbols:
+            entry = _quotes.get(symbol)
+            if entry is not None:
+                fetched_at, quote = entry
+                age = now - fetched_at
+                if quote is not None and age < max_age:
+                    found[symbol] = quote
+                    continue
+                if quote is None and age < QUOTE_MISS_TTL:
+                    continue
+            missing.append(symbol)
+
+    return found, missing
+
+def store_quotes(quotes, requested=()):
+    """
+    Store freshly fetched quotes
+
+    Args:
+        quotes: List of Quote records
+        requested: Symbols that were fetched; those without a quote are
+            remembered as misses for QUOTE_MISS_TTL seconds
+    """
+    now = time.time()
+
+    with _quotes_lock:
+        for symbol in requested:
+            _quotes[symbol] = (now, None)
+        for quote in quotes:
+            _quotes[quote.symbol] = (now, quote)
+            _last_known[quote.symbol] = quote
+
+        if len(_quotes) > QUOTE_STORE_MAX_SYMBOLS:
+            oldest = sorted(_quotes, key=lambda s: _quotes[s][0])[:len(_quotes) - QUOTE_STORE_MAX_SYMBOLS]
+            for symbol in oldest:
+                del _quotes[symbol]
+                _last_known.pop(symbol, None)
+                _demand.pop(symbol, None)
+
+def fill_unresolved(symbols, quotes):
+    """
+    Fill symbols a deadline-bound fetch did not resolve with their last known quotes
+
+    Args:
+        symbols: Requested stock symbols
+        quotes: List of Quote records that were resolved in time
+
+    Returns:
+        Tuple of (quotes in the order of symbols, symbols served from an
+        older quote, symbols without any quote)
+    """
+    resolved = {quote.symbol: quote for quote in quotes}
+    filled = []
+    stale = []
+    missing = []
+
+    with _quotes_lock:
+        for symbol in symbols:
+            quote = resolved.get(symbol)
+            if quote is None:
+                quote = _last_known.get(symbol)
+                if quote is None:
+                    missing.append(symbol)
+                    continue
+                stale.append(symbol)
+            filled.append(quote)
+
+    return filled, stale, missing
+
+def known_symbols(symbols):
+    """
+    Get the symbols that resolved to a quote before
+
+    Args:
+        symbols: List of stock symbols
+
+    Returns:
+        List of the symbols with a last known quote
+    """
+    with _quotes_lock:
+        return [symbol for symbol in symbols if symbol in _last_known]
+
+def record_demand(symbols):
+    """
+    Count a request for symbols, so the refresh job can prioritize them
+
+    Only symbols that resolved to a quote before are counted, so made-up
+    symbols neither grow the counts nor reach the refresh batch.
+
+    Args:
+        symbols: List of requested stock symbols
+    """
+    with _quotes_lock:
+        for symbol in symbols:
+            if symbol in _last_known:
+                _demand[symbol] = _demand.get(symbol, 0.0) + 1.0
+
+def hot_symbols(count):
+    """
+    Get the most requested symbols
+
+    Request counts decay with DEMAND_HALF_LIFE, so symbols nobody asks for
+    anymore drop out over time.
+
+    Args:
+        count: Maximum number of symbols to return
+
+    Returns:
+        List of symbols, most requested first
+    """
+    global _demand_decayed_at
+    now = time.time()
+
+    with _quotes_lock:
+        factor = 0.5 ** (max(0.0, now - _demand_decayed_at) / DEMAND_HALF_LIFE)
+        _demand_decayed_at = now
+        for symbol in list(_demand):
+            _demand[symbol] *= factor
+            # Forget symbols whose count decayed to almost nothing
+            if _demand[symbol] < 0.01:
+                del _demand[symbol]
+        return heapq.nlargest(count, _demand, key=_demand.get)
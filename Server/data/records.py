@@ -0,0 +1,44 @@
+# Quote fields, named as in the API output
+QUOTE_FIELDS = ("symbol", "name", "price", "change", "change_percent", "volume",
+                "marketCap", "sector", "industry", "latest_trading_day")
+
+class Quote:
+    """
+    A stock quote as received from a provider
+
+    One record is created per quote in data.sources and shared, unchanged, by
+    the quote store, snapshot versions and MarketSnapshot columns. Slots keep
+    it at a fraction of the size of the equivalent dictionary, and field names
+    are not repeated per quote. Treat records as read-only.
+    """
+
+    __slots__ = QUOTE_FIELDS
+
+    def __init__(self, symbol, name="", price=0.0, change=0.0, change_percent=0.0, volume=0,
+                 marketCap=0, sector="", industry="", latest_trading_day=""):
+        self.symbol = symbol
+        self.name = name
+        self.price = price
+        self.change = change
+        self.change_percent = change_percent
+        self.volume = volume
+        self.marketCap = marketCap
+        self.sector = sector
+        self.industry = industry
+        self.latest_trading_day = latest_trading_day
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a quote from a dictionary with (a subset of) the quote fields"""
+        return cls(**{field: data[field] for field in QUOTE_FIELDS if field in data})
+
+    def get(self, field, default=None):
+        """Read a field by name, so code written for quote dictionaries keeps working"""
+        return getattr(self, field, default)
+
+    def to_dict(self):
+        """The quote as a dictionary, e.g. to serialize it as JSON"""
+        return {field: getattr(self, field) for field in QUOTE_FIELDS}
+
+    def __repr__(self):
+        return f"Quote({self.symbol!r}, price={self.price!r}, change_percent={self.change_percent!r})"
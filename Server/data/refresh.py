@@ -0,0 +1,106 @@
+import os
+import time
+import logging
+from threading import Lock
+from utils.market_hours import market_session
+from data.quotes import fill_unresolved, hot_symbols
+from data.sources import refresh_quotes, publish_universe, get_sector_data, DEFAULT_SYMBOLS
+
+# Configure module logger
+logger = logging.getLogger(__name__)
+
+# Time to refresh the whole universe once, per market session, in seconds
+REFRESH_CYCLE_SECONDS = {
+    "regular": int(os.environ.get("REFRESH_CYCLE_REGULAR", 300)),
+    "extended": int(os.environ.get("REFRESH_CYCLE_EXTENDED", 1800)),
+    "closed": int(os.environ.get("REFRESH_CYCLE_CLOSED", 6 * 3600)),
+}
+# Number of shards the universe is split into; one shard is refreshed at a time
+REFRESH_SHARDS = int(os.environ.get("REFRESH_SHARDS", 12))
+# How often the scheduler checks whether a shard is due, in seconds
+REFRESH_TICK_SECONDS = int(os.environ.get("REFRESH_TICK_SECONDS", 10))
+# Most requested symbols are refreshed this many times per cycle
+HOT_SYMBOLS_MAX = int(os.environ.get("HOT_SYMBOLS_MAX", 25))
+HOT_REFRESH_FACTOR = int(os.environ.get("HOT_REFRESH_FACTOR", 4))
+
+# Round-robin position and due times, only touched while holding _tick_lock
+_state = {
+    "session": None,
+    "cursor": 0,
+    "next_shard_at": 0.0,
+    "next_hot_at": 0.0,
+}
+_tick_lock = Lock()
+
+def shard_universe(symbols, shards):
+    """
+    Split symbols into shards for round-robin refreshes
+
+    Shards take every n-th symbol, so each one mixes sectors and the heat map
+    changes evenly across a cycle.
+
+    Args:
+        symbols: List of stock symbols
+        shards: Number of shards
+
+    Returns:
+        List of symbol lists
+    """
+    shards = max(1, min(shards, len(symbols)))
+    return [symbols[i::shards] for i in range(shards)]
+
+def refresh_tick():
+    """
+    Refresh the next shard of the universe if it is due - called by scheduler
+
+    The universe is refreshed once per REFRESH_CYCLE_SECONDS of the current
+    market session, one shard at a time, so upstream calls are spread out
+    evenly. Frequently requested symbols are refreshed HOT_REFRESH_FACTOR
+    times as often. A tick that starts while another is still running is
+    skipped.
+    """
+    if not _tick_lock.acquire(blocking=False):
+        logger.debug("Refresh tick skipped, previous tick still running")
+        return
+
+    try:
+        now = time.time()
+        session = market_session()
+        cycle = REFRESH_CYCLE_SECONDS[session]
+        shards = shard_universe(DEFAULT_SYMBOLS, REFRESH_SHARDS)
+
+        # Start over on session changes, e.g. pick up the pace right at the open
+        if session != _state["session"]:
+            logger.info(f"Market session is now {session}, refreshing the universe every {cycle}s")
+            _state.update(session=session, next_shard_at=now, next_hot_at=now)
+
+        batch = []
+        new_cycle = False
+        if now >= _state["next_shard_at"]:
+            cursor = _state["cursor"] % len(shards)
+            batch.extend(shards[cursor])
+            new_cycle = cursor == 0
+            _state.update(cursor=cursor + 1, next_shard_at=now + cycle / len(shards))
+
+        if now >= _state["next_hot_at"]:
+            batch.extend(symbol for symbol in hot_symbols(HOT_SYMBOLS_MAX) if symbol not in batch)
+            _state["next_hot_at"] = now + cycle / HOT_REFRESH_FACTOR
+
+        if not batch:
+            return
+
+        logger.debug(f"Refreshing {len(batch)} symbols ({session} session)")
+        refresh_quotes(batch)
+
+        # Publish the universe from the last known quotes, including those of
+        # shards refreshed earlier in the cycle; a symbol the refresh missed
+        # keeps its previous quote instead of dropping out of the heat map
+        known, _, _ = fill_unresolved(list(dict.fromkeys(DEFAULT_SYMBOLS)), [])
+        if known:
+            # Sector performance is refreshed once per cycle
+            sector_data = get_sector_data(limit=100) if new_cycle else None
+            publish_universe(known, sector_data)
+    except Exception as e:
+        logger.error(f"Error in refresh tick: {str(e)}")
+    finally:
+        _tick_lock.release()
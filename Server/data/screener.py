@@ -0,0 +1,216 @@
+import math
+import heapq
+import logging
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict, namedtuple
+from threading import Lock
+
+# Configure module logger
+logger = logging.getLogger(__name__)
+
+# Fields results can be ordered by; those in ORDERED_FIELDS keep a sorted index
+SORTABLE_FIELDS = ("change_percent", "marketCap", "volume", "price")
+ORDERED_FIELDS = ("change_percent", "marketCap")
+
+# Indexed view of one quote. Sector and industry are normalized like in
+# MarketSnapshot; bucket is the power of ten of the market cap (-1 if unknown)
+IndexEntry = namedtuple("IndexEntry", ["quote", "sector", "industry", "bucket", "values"])
+
+# Current universe: symbol -> IndexEntry, plus the secondary indexes over it
+_entries = {}
+_by_sector = defaultdict(set)
+_by_industry = defaultdict(set)
+_by_bucket = defaultdict(set)
+# Sorted lists of (value, symbol) per ordered field
+_ordered = {field: [] for field in ORDERED_FIELDS}
+_state = {"version": None}
+_index_lock = Lock()
+
+def _number(value):
+    """A quote field as a float, treating None, NaN, infinities and garbage as 0"""
+    try:
+        number = float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+    return number if math.isfinite(number) else 0.0
+
+def _bucket(market_cap):
+    return int(math.floor(math.log10(market_cap))) if market_cap >= 1 else -1
+
+def _make_entry(quote):
+    sector = str(quote.sector).upper() if quote.sector else "OTHER"
+    industry = str(quote.industry).upper() if quote.industry else sector
+    values = {field: _number(getattr(quote, field)) for field in SORTABLE_FIELDS}
+    return IndexEntry(quote, sector, industry, _bucket(values["marketCap"]), values)
+
+def _add(symbol, entry):
+    _entries[symbol] = entry
+    _by_sector[entry.sector].add(symbol)
+    _by_industry[entry.industry].add(symbol)
+    _by_bucket[entry.bucket].add(symbol)
+    for field in ORDERED_FIELDS:
+        insort(_ordered[field], (entry.values[field], symbol))
+
+def _discard(index, key, symbol):
+    members = index[key]
+    members.discard(symbol)
+    if not members:
+        del index[key]
+
+def _remove(symbol):
+    entry = _entries.pop(symbol)
+    _discard(_by_sector, entry.sector, symbol)
+    _discard(_by_industry, entry.industry, symbol)
+    _discard(_by_bucket, entry.bucket, symbol)
+    for field in ORDERED_FIELDS:
+        ordered = _ordered[field]
+        del ordered[bisect_left(ordered, (entry.values[field], symbol))]
+
+def update_index(quotes, version=None):
+    """
+    Bring the indexes up to date with a newly published universe
+
+    Only quotes that are new or were refetched (a different Quote record than
+    the indexed one) are re-indexed, and symbols no longer in the universe are
+    removed, so a refresh of one shard only touches that shard's entries.
+
+    Args:
+        quotes: List of Quote records making up the whole universe
+        version: Snapshot version the quotes were published under
+    """
+    current = {quote.symbol: quote for quote in quotes}
+
+    with _index_lock:
+        removed = [symbol for symbol in _entries if symbol not in current]
+        for symbol in removed:
+            _remove(symbol)
+
+        changed = 0
+        for symbol, quote in current.items():
+            entry = _entries.get(symbol)
+            if entry is not None and entry.quote is quote:
+                continue
+            if entry is not None:
+                _remove(symbol)
+            _add(symbol, _make_entry(quote))
+            changed += 1
+
+        _state["version"] = version
+
+    logger.debug(f"Screener index at version {version}: {changed} updated, {len(removed)} removed")
+
+def _union(index, keys):
+    members = set()
+    for key in keys:
+        members |= index.get(key, set())
+    return members
+
+def _cap_buckets(min_market_cap, max_market_cap):
+    """Market cap buckets that can hold values in the range"""
+    low = _bucket(min_market_cap) if min_market_cap is not None else -1
+    high = _bucket(max_market_cap) if max_market_cap is not None else None
+    return [bucket for bucket in _by_bucket if bucket >= low and (high is None or bucket <= high)]
+
+def screen_stocks(sectors=None, industries=None, min_market_cap=None, max_market_cap=None,
+                  min_change=None, max_change=None, sort="change_percent", descending=True, limit=50):
+    """
+    Filter the current universe using the indexes
+
+    Candidates come from the most selective index for the given filters (a
+    sector or industry set, the market cap buckets or a change percent range
+    of the sorted index); only they are checked against the other filters.
+    Without filters, results are read straight off the sorted index of the
+    sort field. Either way the cost follows the result, not the universe.
+
+    Args:
+        sectors: Sector names to include (optional)
+        industries: Industry names to include (optional)
+        min_market_cap, max_market_cap: Market cap range in $ (optional)
+        min_change, max_change: Change percent range (optional)
+        sort: Field to order by, one of SORTABLE_FIELDS
+        descending: Largest values first if True
+        limit: Maximum number of results
+
+    Returns:
+        Tuple of (matching Quote records in order, index version)
+    """
+    if sort not in SORTABLE_FIELDS:
+        raise ValueError(f"sort must be one of {', '.join(SORTABLE_FIELDS)}")
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    for bound in (min_market_cap, max_market_cap, min_change, max_change):
+        if bound is not None and not math.isfinite(bound):
+            raise ValueError("range bounds must be finite numbers")
+
+    predicates = []
+    if sectors:
+        sectors = {sector.upper() for sector in sectors}
+        predicates.append(lambda entry: entry.sector in sectors)
+    if industries:
+        industries = {industry.upper() for industry in industries}
+        predicates.append(lambda entry: entry.industry in industries)
+    if min_market_cap is not None:
+        predicates.append(lambda entry: entry.values["marketCap"] >= min_market_cap)
+    if max_market_cap is not None:
+        predicates.append(lambda entry: entry.values["marketCap"] <= max_market_cap)
+    if min_change is not None:
+        predicates.append(lambda entry: entry.values["change_percent"] >= min_change)
+    if max_change is not None:
+        predicates.append(lambda entry: entry.values["change_percent"] <= max_change)
+
+    with _index_lock:
+        version = _state["version"]
+
+        # Change range: a slice of the sorted index, already in change order
+        ordered = _ordered["change_percent"]
+        start, end = 0, len(ordered)
+        if min_change is not None:
+            start = bisect_left(ordered, (min_change,))
+        if max_change is not None:
+            end = bisect_right(ordered, (max_change, chr(0x10FFFF)))
+
+        # Index lookups for the other filters, as (index, keys, candidate count)
+        candidates = []
+        if sectors:
+            candidates.append((_by_sector, sectors))
+        if industries:
+            candidates.append((_by_industry, industries))
+        if min_market_cap is not None or max_market_cap is not None:
+            candidates.append((_by_bucket, _cap_buckets(min_market_cap, max_market_cap)))
+        candidates = [(index, keys, sum(len(index.get(key, ())) for key in keys)) for index, keys in candidates]
+        narrowest = min(candidates, key=lambda candidate: candidate[2]) if candidates else None
+
+        if narrowest is not None and narrowest[2] <= end - start:
+            symbols = _union(narrowest[0], narrowest[1])
+        elif sort == "change_percent" or (sort in ORDERED_FIELDS and end - start == len(ordered)):
+            # Walk the sorted index of the sort field in result order and stop at the limit
+            if sort != "change_percent":
+                ordered, start, end = _ordered[sort], 0, len(_ordered[sort])
+            steps = range(end - 1, start - 1, -1) if descending else range(start, end)
+            results = []
+            for i in steps:
+                entry = _entries[ordered[i][1]]
+                if all(predicate(entry) for predicate in predicates):
+                    results.append(entry.quote)
+                    if len(results) >= limit:
+                        break
+            return results, version
+        else:
+            symbols = [symbol for _, symbol in ordered[start:end]]
+
+        matches = [entry for entry in map(_entries.__getitem__, symbols)
+                   if all(predicate(entry) for predicate in predicates)]
+
+    pick = heapq.nlargest if descending else heapq.nsmallest
+    top = pick(limit, matches, key=lambda entry: (entry.values[sort], entry.quote.symbol))
+    return [entry.quote for entry in top], version
+
+def get_index_stats():
+    """Number of indexed symbols, sectors, industries and the index version"""
+    with _index_lock:
+        return {
+            "symbols": len(_entries),
+            "sectors": len(_by_sector),
+            "industries": len(_by_industry),
+            "version": _state["version"],
+        }
@@ -0,0 +1,131 @@
+import logging
+from operator import attrgetter
+import numpy as np
+import pandas as pd
+
+# Configure module logger
+logger = logging.getLogger(__name__)
+
+# Heat map colours for every intensity, computed once. Index with
+# intensity + 256 for non-negative values, intensity alone for negative ones.
+NEGATIVE_PALETTE = [f"rgba(255, {255 - i}, {255 - i}, 1)" for i in range(256)]
+POSITIVE_PALETTE = [f"rgba({255 - i}, 255, {255 - i}, 1)" for i in range(256)]
+PALETTE = np.array(NEGATIVE_PALETTE + POSITIVE_PALETTE, dtype=object)
+
+# Snapshot columns and the value used when a quote does not have the field
+FIELD_DEFAULTS = {
+    "symbol": "",
+    "name": "",
+    "price": 0,
+    "change": 0,
+    "change_percent": 0,
+    "volume": 0,
+    "marketCap": 0,
+    "sector": "",
+    "industry": "",
+}
+
+def palette_colors(values, intensity):
+    """
+    Look up heat map colours for an array of values
+
+    Args:
+        values: Array of signed values (negative is red, otherwise green)
+        intensity: Integer array of colour intensities in 0-255
+
+    Returns:
+        Object array of rgba() strings
+    """
+    return PALETTE[intensity + 256 * (values >= 0)]
+
+def to_numeric(values):
+    """Convert an object column to float64, treating None and garbage as 0"""
+    try:
+        numeric = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        numeric = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(dtype=np.float64)
+    return np.where(np.isnan(numeric), 0.0, numeric)
+
+def _normalize_names(values, fallback):
+    """
+    Upper-case a column of names, using fallback where a name is empty
+
+    Only the distinct values are upper-cased, then mapped back to the rows.
+
+    Args:
+        values: Object array of names
+        fallback: Object array used for rows with an empty name
+
+    Returns:
+        Object array of normalized names
+    """
+    codes, uniques = pd.factorize(values, sort=False, use_na_sentinel=True)
+    normalized = np.array([str(u).upper() if u else None for u in uniques] + [None], dtype=object)
+    # Missing values have code -1, which picks the trailing None
+    names = normalized[codes]
+    empty = pd.isna(names)
+    if empty.any():
+        names[empty] = fallback[empty] if isinstance(fallback, np.ndarray) else fallback
+    return names
+
+class MarketSnapshot:
+    """
+    Columnar snapshot of a quote universe
+
+    Raw columns keep the original Python values (object arrays) so output can
+    echo them unchanged; numeric columns are float64 arrays used for the
+    vectorized heat map calculations. Sector and industry are normalized
+    (upper-cased, "OTHER" when missing) and factorized into integer codes in
+    order of first appearance.
+    """
+
+    def __init__(self, columns):
+        self.raw = columns
+        self.size = len(columns["symbol"])
+
+        self.change_percent = to_numeric(columns["change_percent"])
+        self.volume = to_numeric(columns["volume"])
+        self.market_cap = to_numeric(columns["marketCap"])
+
+        sectors = _normalize_names(columns["sector"], "OTHER")
+        industries = _normalize_names(columns["industry"], sectors)
+
+        self.sector_codes, self.sectors = pd.factorize(sectors, sort=False)
+        self.industry_codes, self.industries = pd.factorize(industries, sort=False)
+
+    @classmethod
+    def from_items(cls, items):
+        """
+        Build a snapshot from a list of quotes
+
+        Args:
+            items: List of Quote records or quote dictionaries
+
+        Returns:
+            MarketSnapshot
+        """
+        columns = {}
+        for field, default in FIELD_DEFAULTS.items():
+            column = np.empty(len(items), dtype=object)
+            try:
+                # Quote records have every field, so columns are plain attribute reads
+                column[:] = list(map(attrgetter(field), items))
+            except AttributeError:
+                column[:] = [item.get(field, default) for item in items]
+            columns[field] = column
+        return cls(columns)
+
+    def __len__(self):
+        return self.size
+
+    def take(self, indices):
+        """Return a new snapshot with only the rows at indices, in that order"""
+        return MarketSnapshot({field: column[indices] for field, column in self.raw.items()})
+
+    def sector_names(self):
+        """Object array with the normalized sector of every row"""
+        return np.asarray(self.sectors, dtype=object)[self.sector_codes]
+
+    def industry_names(self):
+        """Object array with the normalized industry of every row"""
+        return np.asarray(self.industries, dtype=object)[self.industry_codes]
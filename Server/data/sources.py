@@ -1,12 +1,26 @@
 import os
 import logging
 import time
-import requests
+import functools
 import yfinance as yf
 import pandas as pd
 from datetime import datetime, timedelta
-from utils.cache import get_cached_data, cache_data
-from data.processors import process_stock_data, process_historical_data, process_sector_data
+from threading import Lock
+from utils.cache import cache_many, delete_cached
+from data.metadata import get_ticker_metadata
+from data.records import Quote
+from data.quotes import lookup_quotes, store_quotes, fill_unresolved, known_symbols
+from data.history_store import get_history
+from data.versions import publish_snapshot, latest_snapshot, snapshot_delta
+from data.views import materialize_views, STOCKS_BY_SECTOR_DEFAULT_LIMIT
+from data.screener import update_index
+from utils.events import publish_event
+from utils.concurrency import fan_out
+from utils.http_client import get_json, UpstreamError, HTTP_READ_TIMEOUT
+from utils.providers import register_provider, fetch_with_failover, LocalResult
+from utils.rate_limit import rate_limiter, RateLimitExceeded, DEFAULT_MAX_WAIT
+from data.processors import (process_stock_data, process_historical_data, process_sector_data,
+                             process_stocks_by_sector, process_sector_delta)
 
 # Configure module logger
 logger = logging.getLogger(__name__)
@@ -15,6 +29,18 @@ logger = logging.getLogger(__name__)
 ALPHA_VANTAGE_API_KEY = os.environ.get("ALPHA_VANTAGE_API_KEY", "UZU19YTV2XQGQ02V")
 FMP_API_KEY = os.environ.get("FMP_API_KEY", "demo")
 
+# Several keys per provider may be given as a comma-separated list
+ALPHA_VANTAGE_API_KEYS = [key.strip() for key in os.environ.get("ALPHA_VANTAGE_API_KEYS", ALPHA_VANTAGE_API_KEY).split(",")]
+FMP_API_KEYS = [key.strip() for key in os.environ.get("FMP_API_KEYS", FMP_API_KEY).split(",")]
+
+rate_limiter.register_keys("alpha_vantage", ALPHA_VANTAGE_API_KEYS)
+rate_limiter.register_keys("fmp", FMP_API_KEYS)
+
+FMP_BASE_URL = "https://financialmodelingprep.com/api/v3"
+
+# Symbols processed together when historical data is streamed
+HISTORICAL_CHUNK_SIZE = int(os.environ.get("HISTORICAL_CHUNK_SIZE", 25))
+
 # Default symbols for initial data load
 DEFAULT_SYMBOLS = [
     # Technology
@@ -58,23 +84,50 @@ DEFAULT_SYMBOLS = [
     "GM", "F", "RIVN", "LCID", "NKLA", "TSLA", "NIO", "XPEV", "LI", "FREY"
 ]
 
+# Symbols pushed over /api/stream: the universe of the default
+# /stocks-by-sector view, so streamed and fetched heat maps show the same tiles
+STREAM_SYMBOLS = list(dict.fromkeys(DEFAULT_SYMBOLS[:STOCKS_BY_SECTOR_DEFAULT_LIMIT]))
+
 
 # Data source functions
-def get_alpha_vantage_data(symbols, function="GLOBAL_QUOTE"):
-    """Fetch data from Alpha Vantage API"""
+def get_alpha_vantage_data(symbols, function="GLOBAL_QUOTE", deadline=None):
+    """
+    Fetch data from Alpha Vantage API
+    
+    Calls are paced by the shared rate limiter without waiting for it: once
+    no slot is free, the remaining symbols are skipped, so the result may be
+    partial.
+    
+    Args:
+        symbols: List of stock symbols
+        function: Alpha Vantage function name (default: GLOBAL_QUOTE)
+        deadline: time.monotonic() value to stop issuing calls at (optional)
+        
+    Returns:
+        List of Quote records; a LocalResult if no call could be made
+        
+    Raises:
+        UpstreamError: If calls failed and none returned a quote
+    """
     results = []
+    called = False
+    error = None
+    
+    # Bound the whole batch, not each call, so a fallback never pins the worker
+    if deadline is None:
+        deadline = time.monotonic() + DEFAULT_MAX_WAIT
     
-    # Rate limiting: 5 calls per minute for free tier
     for i, symbol in enumerate(symbols):
-        if i > 0 and i % 5 == 0:
-            logger.debug("Alpha Vantage rate limit reached, pausing for 65 seconds")
-            time.sleep(65)
+        api_key = rate_limiter.acquire("alpha_vantage", deadline=deadline, block=False)
+        if api_key is None:
+            logger.warning(f"Alpha Vantage rate limit: skipping {len(symbols) - i} symbols without a free slot")
+            break
             
-        url = f"https://www.alphavantage.co/query?function={function}&symbol={symbol}&apikey={ALPHA_VANTAGE_API_KEY}"
+        params = {"function": function, "symbol": symbol, "apikey": api_key}
         
+        called = True
         try:
-            response = requests.get(url)
-            data = response.json()
+            data = get_json("alpha_vantage", "https://www.alphavantage.co/query", params=params, deadline=deadline)
             
             if "Error Message" in data:
                 logger.warning(f"Alpha Vantage error for {symbol}: {data['Error Message']}")
@@ -82,308 +135,246 @@ def get_alpha_vantage_data(symbols, function="GLOBAL_QUOTE"):
                 
             if "Global Quote" in data:
                 quote = data["Global Quote"]
-                results.append({
-                    "symbol": symbol,
-                    "price": float(quote.get("05. price", 0)),
-                    "change": float(quote.get("09. change", 0)),
-                    "change_percent": float(quote.get("10. change percent", "0%").replace('%', '')),
-                    "volume": int(quote.get("06. volume", 0)),
-                    "latest_trading_day": quote.get("07. latest trading day", "")
-                })
+                results.append(Quote(
+                    symbol,
+                    price=float(quote.get("05. price", 0)),
+                    change=float(quote.get("09. change", 0)),
+                    change_percent=float(quote.get("10. change percent", "0%").replace('%', '')),
+                    volume=int(quote.get("06. volume", 0)),
+                    latest_trading_day=quote.get("07. latest trading day", "")
+                ))
             else:
                 logger.warning(f"No data returned from Alpha Vantage for {symbol}")
         except Exception as e:
             logger.error(f"Error fetching Alpha Vantage data for {symbol}: {str(e)}")
+            error = e
     
-    return results
+    if error is not None and not results:
+        raise UpstreamError(f"Alpha Vantage returned no quotes: {str(error)}")
+    return results if called else LocalResult(results)
 
-def get_yahoo_finance_data(symbols):
-    """Fetch data from Yahoo Finance API via yfinance"""
-    try:
-        # Create a space-separated string of symbols
-        symbols_str = " ".join(symbols)
-        
-        # Use yfinance to get current data for all symbols at once
-        data = yf.download(symbols_str, period="1d", group_by="ticker")
+def _yahoo_quotes(symbols, deadline=None):
+    """
+    Get quotes from the quote store, downloading missing or stale ones
+    
+    Args:
+        symbols: List of stock symbols
+        deadline: time.monotonic() value the download must finish by (optional)
         
-        results = []
+    Returns:
+        Tuple of (Quote records in the order of symbols, whether a download was made)
         
-        # Define a mapping for default sectors if needed
-        default_sectors = {
-            # Technology
-            "AAPL": {"sector": "TECHNOLOGY", "industry": "CONSUMER ELECTRONICS"},
-            "MSFT": {"sector": "TECHNOLOGY", "industry": "SOFTWARE"},
-            "GOOGL": {"sector": "TECHNOLOGY", "industry": "INTERNET CONTENT & INFORMATION"},
-            "AMZN": {"sector": "CONSUMER CYCLICAL", "industry": "INTERNET RETAIL"},
-            "META": {"sector": "TECHNOLOGY", "industry": "INTERNET CONTENT & INFORMATION"},
-            "TSLA": {"sector": "CONSUMER CYCLICAL", "industry": "AUTO MANUFACTURERS"},
-            "NVDA": {"sector": "TECHNOLOGY", "industry": "SEMICONDUCTORS"},
-            "INTC": {"sector": "TECHNOLOGY", "industry": "SEMICONDUCTORS"},
-            "AMD": {"sector": "TECHNOLOGY", "industry": "SEMICONDUCTORS"},
-            "CSCO": {"sector": "TECHNOLOGY", "industry": "COMMUNICATION EQUIPMENT"},
-            "IBM": {"sector": "TECHNOLOGY", "industry": "INFORMATION TECHNOLOGY SERVICES"},
-            "ORCL": {"sector": "TECHNOLOGY", "industry": "SOFTWARE"},
-            "ADBE": {"sector": "TECHNOLOGY", "industry": "SOFTWARE"},
-            "CRM": {"sector": "TECHNOLOGY", "industry": "SOFTWARE"},
-            "TXN": {"sector": "TECHNOLOGY", "industry": "SEMICONDUCTORS"},
-            "AVGO": {"sector": "TECHNOLOGY", "industry": "SEMICONDUCTORS"},
-            "QCOM": {"sector": "TECHNOLOGY", "industry": "SEMICONDUCTORS"},
-            "PYPL": {"sector": "FINANCIAL SERVICES", "industry": "CREDIT SERVICES"},
-            "NOW": {"sector": "TECHNOLOGY", "industry": "SOFTWARE"},
-            "SNOW": {"sector": "TECHNOLOGY", "industry": "DATA INFRASTRUCTURE"},
-            "ZS": {"sector": "TECHNOLOGY", "industry": "CYBERSECURITY"},
-            "PANW": {"sector": "TECHNOLOGY", "industry": "CYBERSECURITY"},
-            "MDB": {"sector": "TECHNOLOGY", "industry": "DATABASE MANAGEMENT"},
-            "TTD": {"sector": "TECHNOLOGY", "industry": "DIGITAL ADVERTISING"},
-            "DOCU": {"sector": "TECHNOLOGY", "industry": "CLOUD COMPUTING"},
-            "CRWD": {"sector": "TECHNOLOGY", "industry": "CYBERSECURITY"},
-            "PLTR": {"sector": "TECHNOLOGY", "industry": "BIG DATA"},
-            "SHOP": {"sector": "TECHNOLOGY", "industry": "E-COMMERCE"},
-            "SQ": {"sector": "TECHNOLOGY", "industry": "FINTECH"},
-            "DDOG": {"sector": "TECHNOLOGY", "industry": "CLOUD MONITORING"},
-            "NET": {"sector": "TECHNOLOGY", "industry": "CLOUD COMPUTING"},
-            "TWLO": {"sector": "TECHNOLOGY", "industry": "COMMUNICATION SERVICES"},
-            "U": {"sector": "TECHNOLOGY", "industry": "GAME DEVELOPMENT"},
-            "ROKU": {"sector": "TECHNOLOGY", "industry": "STREAMING MEDIA"},
-            
-            # Financials
-            "JPM": {"sector": "FINANCIAL SERVICES", "industry": "BANKS"},
-            "BAC": {"sector": "FINANCIAL SERVICES", "industry": "BANKS"},
-            "GS": {"sector": "FINANCIAL SERVICES", "industry": "CAPITAL MARKETS"},
-            "MS": {"sector": "FINANCIAL SERVICES", "industry": "CAPITAL MARKETS"},
-            "BLK": {"sector": "FINANCIAL SERVICES", "industry": "ASSET MANAGEMENT"},
-            "C": {"sector": "FINANCIAL SERVICES", "industry": "BANKS"},
-            "WFC": {"sector": "FINANCIAL SERVICES", "industry": "BANKS"},
-            "AXP": {"sector": "FINANCIAL SERVICES", "industry": "CREDIT SERVICES"},
-            "SCHW": {"sector": "FINANCIAL SERVICES", "industry": "BROKERAGE"},
-            "BRK.B": {"sector": "FINANCIAL SERVICES", "industry": "DIVERSIFIED FINANCIALS"},
-            
-            # Consumer Goods & Retail
-            "WMT": {"sector": "CONSUMER DEFENSIVE", "industry": "DISCOUNT STORES"},
-            "PG": {"sector": "CONSUMER DEFENSIVE", "industry": "HOUSEHOLD PRODUCTS"},
-            "KO": {"sector": "CONSUMER DEFENSIVE", "industry": "BEVERAGES"},
-            "PEP": {"sector": "CONSUMER DEFENSIVE", "industry": "BEVERAGES"},
-            "COST": {"sector": "CONSUMER DEFENSIVE", "industry": "DISCOUNT STORES"},
-            "MCD": {"sector": "CONSUMER CYCLICAL", "industry": "RESTAURANTS"},
-            "NKE": {"sector": "CONSUMER CYCLICAL", "industry": "FOOTWEAR & ACCESSORIES"},
-            "SBUX": {"sector": "CONSUMER CYCLICAL", "industry": "RESTAURANTS"},
-            "TGT": {"sector": "CONSUMER DEFENSIVE", "industry": "DEPARTMENT STORES"},
-            
-            # Healthcare
-            "JNJ": {"sector": "HEALTHCARE", "industry": "DRUG MANUFACTURERS"},
-            "PFE": {"sector": "HEALTHCARE", "industry": "DRUG MANUFACTURERS"},
-            "MRK": {"sector": "HEALTHCARE", "industry": "DRUG MANUFACTURERS"},
-            "LLY": {"sector": "HEALTHCARE", "industry": "DRUG MANUFACTURERS"},
-            "ABBV": {"sector": "HEALTHCARE", "industry": "DRUG MANUFACTURERS"},
-            "TMO": {"sector": "HEALTHCARE", "industry": "DIAGNOSTICS & RESEARCH"},
-            "ABT": {"sector": "HEALTHCARE", "industry": "MEDICAL DEVICES"},
-            "DHR": {"sector": "HEALTHCARE", "industry": "DIAGNOSTICS & RESEARCH"},
-            
-            # Industrials
-            "BA": {"sector": "INDUSTRIALS", "industry": "AEROSPACE & DEFENSE"},
-            "LMT": {"sector": "INDUSTRIALS", "industry": "AEROSPACE & DEFENSE"},
-            "CAT": {"sector": "INDUSTRIALS", "industry": "FARM & HEAVY CONSTRUCTION MACHINERY"},
-            "DE": {"sector": "INDUSTRIALS", "industry": "FARM & HEAVY CONSTRUCTION MACHINERY"},
-            "HON": {"sector": "INDUSTRIALS", "industry": "DIVERSIFIED INDUSTRIALS"},
-            "UPS": {"sector": "INDUSTRIALS", "industry": "INTEGRATED FREIGHT & LOGISTICS"},
-            
-            # Energy
-            "XOM": {"sector": "ENERGY", "industry": "OIL & GAS INTEGRATED"},
-            "CVX": {"sector": "ENERGY", "industry": "OIL & GAS INTEGRATED"},
-            "OXY": {"sector": "ENERGY", "industry": "OIL & GAS EXPLORATION"},
-            
-            # Communication & Media
-            "DIS": {"sector": "COMMUNICATION SERVICES", "industry": "ENTERTAINMENT"},
-            "NFLX": {"sector": "COMMUNICATION SERVICES", "industry": "ENTERTAINMENT"},
-            "CMCSA": {"sector": "COMMUNICATION SERVICES", "industry": "ENTERTAINMENT"},
-            "T": {"sector": "COMMUNICATION SERVICES", "industry": "TELECOM SERVICES"},
-            "VZ": {"sector": "COMMUNICATION SERVICES", "industry": "TELECOM SERVICES"},
-            "TMUS": {"sector": "COMMUNICATION SERVICES", "industry": "WIRELESS CARRIERS"},
-            
-            # Miscellaneous
-            "SPG": {"sector": "REAL ESTATE", "industry": "REITs"},
-            "PLD": {"sector": "REAL ESTATE", "industry": "REITs"},
-        }
+    Raises:
+        UpstreamError: If the download failed
+    """
+    symbols = list(dict.fromkeys(symbols))
+    quotes, missing = lookup_quotes(symbols)
+    
+    timeout = HTTP_READ_TIMEOUT
+    if deadline is not None:
+        timeout = min(timeout, deadline - time.monotonic())
+    
+    downloaded = False
+    if missing and timeout <= 0:
+        logger.warning(f"Deadline passed, not downloading {len(missing)} Yahoo Finance quotes")
+    elif missing:
+        logger.debug(f"Quote store: {len(quotes)} cached, downloading {len(missing)} symbols")
+        downloaded = True
+        fetched = _download_yahoo_quotes(missing, timeout=timeout)
+        store_quotes(fetched, requested=missing)
+        quotes.update((quote.symbol, quote) for quote in fetched)
+    
+    return [quotes[symbol] for symbol in symbols if symbol in quotes], downloaded
 
+def get_yahoo_finance_data(symbols, deadline=None):
+    """
+    Get quotes from Yahoo Finance, served from the per-symbol quote store
+    
+    Only symbols that are missing or stale in the store are downloaded, in a
+    single batched request.
+    
+    Args:
+        symbols: List of stock symbols
+        deadline: time.monotonic() value the download must finish by (optional)
+        
+    Returns:
+        List of Quote records in the order of symbols
+    """
+    try:
+        return _yahoo_quotes(symbols, deadline)[0]
+    except Exception as e:
+        logger.error(f"Error fetching Yahoo Finance data: {str(e)}")
+        quotes, _ = lookup_quotes(symbols)
+        return [quotes[symbol] for symbol in dict.fromkeys(symbols) if symbol in quotes]
 
+def _yahoo_provider(symbols, limit, deadline=None):
+    """Yahoo Finance quote provider; answers made without a download are not recorded in its health"""
+    quotes, downloaded = _yahoo_quotes(symbols, deadline)
+    return quotes if downloaded else LocalResult(quotes)
 
-        
-        # Fetch additional info for all symbols (sector, industry, market cap)
-        ticker_info = {}
+def _download_yahoo_quotes(symbols, timeout=HTTP_READ_TIMEOUT):
+    """
+    Fetch data from Yahoo Finance API via yfinance
+    
+    yfinance logs failed tickers rather than raising, so a download without
+    any data counts as failed only if Yahoo quoted some of the symbols
+    before; for unknown symbols alone, no data is a valid answer.
+    
+    Raises:
+        UpstreamError: If the download failed
+    """
+    # Create a space-separated string of symbols
+    symbols_str = " ".join(symbols)
+    
+    # Use yfinance to get current data for all symbols at once
+    try:
+        data = yf.download(symbols_str, period="1d", group_by="ticker", timeout=timeout)
+    except Exception as e:
+        raise UpstreamError(f"Yahoo Finance download failed: {str(e)}") from e
+    
+    # Price fields by symbol, for the symbols Yahoo returned data for
+    prices = {}
+    
+    # Handle different output formats based on number of symbols
+    if len(symbols) == 1:
+        symbol = symbols[0]
+        try:
+            change = data["Close"].iloc[-1] - data["Open"].iloc[-1]
+            change_percent = (change / data["Open"].iloc[-1]) * 100 if data["Open"].iloc[-1] > 0 else 0
+            
+            prices[symbol] = dict(
+                price=float(data["Close"].iloc[-1]),
+                change=float(change),
+                change_percent=float(change_percent),
+                volume=int(data["Volume"].iloc[-1]),
+                latest_trading_day=data.index[-1].strftime("%Y-%m-%d")
+            )
+        except Exception as e:
+            logger.warning(f"Error processing Yahoo Finance data for {symbol}: {str(e)}")
+    else:
         for symbol in symbols:
             try:
-                # Get ticker information one at a time
-                ticker = yf.Ticker(symbol)
-                print("🚀 ~ ticker:", ticker)
-                info = ticker.info
-                
-                # Extract sector and industry
-                sector = info.get("sector", "")
-                industry = info.get("industry", "")
-                
-                # Use default values if not available from API
-                if not sector and symbol in default_sectors:
-                    sector = default_sectors[symbol]["sector"]
+                if symbol in data:
+                    symbol_data = data[symbol]
+                    change = symbol_data["Close"].iloc[-1] - symbol_data["Open"].iloc[-1]
+                    change_percent = (change / symbol_data["Open"].iloc[-1]) * 100 if symbol_data["Open"].iloc[-1] > 0 else 0
                     
-                if not industry and symbol in default_sectors:
-                    industry = default_sectors[symbol]["industry"]
-                
-                # Store the information
-                ticker_info[symbol] = {
-                    "name": info.get("shortName", ""),
-                    "sector": sector.upper() if sector else "OTHER",
-                    "industry": industry.upper() if industry else sector.upper() if sector else "OTHER",
-                    "marketCap": info.get("marketCap", 0)
-                }
-                
-                logger.debug(f"Retrieved info for {symbol}: sector={ticker_info[symbol]['sector']}, industry={ticker_info[symbol]['industry']}")
-                
-            except Exception as e:
-                logger.warning(f"Error fetching detailed info for {symbol}: {str(e)}")
-                
-                # Use default values if available
-                if symbol in default_sectors:
-                    ticker_info[symbol] = {
-                        "name": "",
-                        "sector": default_sectors[symbol]["sector"],
-                        "industry": default_sectors[symbol]["industry"],
-                        "marketCap": 0
-                    }
-                else:
-                    ticker_info[symbol] = {
-                        "name": "",
-                        "sector": "OTHER",
-                        "industry": "OTHER",
-                        "marketCap": 0
-                    }
-        
-        # Handle different output formats based on number of symbols
-        if len(symbols) == 1:
-            symbol = symbols[0]
-            try:
-                change = data["Close"].iloc[-1] - data["Open"].iloc[-1]
-                change_percent = (change / data["Open"].iloc[-1]) * 100 if data["Open"].iloc[-1] > 0 else 0
-                
-                results.append({
-                    "symbol": symbol,
-                    "name": ticker_info[symbol]["name"],
-                    "price": float(data["Close"].iloc[-1]),
-                    "change": float(change),
-                    "change_percent": float(change_percent),
-                    "volume": int(data["Volume"].iloc[-1]),
-                    "marketCap": ticker_info[symbol]["marketCap"],
-                    "sector": ticker_info[symbol]["sector"],
-                    "industry": ticker_info[symbol]["industry"],
-                    "latest_trading_day": data.index[-1].strftime("%Y-%m-%d")
-                })
+                    prices[symbol] = dict(
+                        price=float(symbol_data["Close"].iloc[-1]),
+                        change=float(change),
+                        change_percent=float(change_percent),
+                        volume=int(symbol_data["Volume"].iloc[-1]),
+                        latest_trading_day=symbol_data.index[-1].strftime("%Y-%m-%d")
+                    )
             except Exception as e:
                 logger.warning(f"Error processing Yahoo Finance data for {symbol}: {str(e)}")
-        else:
-            for symbol in symbols:
-                try:
-                    if symbol in data:
-                        symbol_data = data[symbol]
-                        change = symbol_data["Close"].iloc[-1] - symbol_data["Open"].iloc[-1]
-                        change_percent = (change / symbol_data["Open"].iloc[-1]) * 100 if symbol_data["Open"].iloc[-1] > 0 else 0
-                        
-                        results.append({
-                            "symbol": symbol,
-                            "name": ticker_info[symbol]["name"],
-                            "price": float(symbol_data["Close"].iloc[-1]),
-                            "change": float(change),
-                            "change_percent": float(change_percent),
-                            "volume": int(symbol_data["Volume"].iloc[-1]),
-                            "marketCap": ticker_info[symbol]["marketCap"],
-                            "sector": ticker_info[symbol]["sector"],
-                            "industry": ticker_info[symbol]["industry"],
-                            "latest_trading_day": symbol_data.index[-1].strftime("%Y-%m-%d")
-                        })
-                except Exception as e:
-                    logger.warning(f"Error processing Yahoo Finance data for {symbol}: {str(e)}")
-        
-        return results
-    except Exception as e:
-        logger.error(f"Error fetching Yahoo Finance data: {str(e)}")
-        return []
+    
+    # Sector, industry and market cap come from the in-memory metadata store;
+    # only symbols with data are looked up, so misses are not queued for a refresh
+    ticker_info = get_ticker_metadata(list(prices))
+    results = [
+        Quote(
+            symbol,
+            name=ticker_info[symbol]["name"],
+            marketCap=ticker_info[symbol]["marketCap"],
+            sector=ticker_info[symbol]["sector"],
+            industry=ticker_info[symbol]["industry"],
+            **fields
+        )
+        for symbol, fields in prices.items()
+    ]
+    
+    if not results and known_symbols(symbols):
+        raise UpstreamError(f"Yahoo Finance returned no data for {len(symbols)} symbols")
+    return results
+
+def _get_fmp_profile(symbol, deadline=None):
+    """Fetch name, sector, industry and market cap for one symbol from FMP"""
+    api_key = rate_limiter.acquire("fmp", deadline=deadline, block=False)
+    if api_key is None:
+        raise RateLimitExceeded(f"No FMP rate limit slot available for {symbol}")
+    
+    profile_data = get_json("fmp", f"{FMP_BASE_URL}/profile/{symbol}", params={"apikey": api_key}, deadline=deadline)
+    
+    if profile_data and isinstance(profile_data, list) and len(profile_data) > 0:
+        return {
+            "name": profile_data[0].get("companyName", ""),
+            "sector": profile_data[0].get("sector", ""),
+            "industry": profile_data[0].get("industry", ""),
+            "marketCap": profile_data[0].get("mktCap", 0)
+        }
+    return {"name": "", "sector": "", "industry": "", "marketCap": 0}
 
-def get_fmp_data(symbols=None, limit=30):
-    """Fetch data from Financial Modeling Prep API"""
+def get_fmp_data(symbols=None, limit=30, deadline=None):
+    """
+    Fetch data from Financial Modeling Prep API
+    
+    Profiles that cannot be fetched before the deadline, or without waiting
+    for a rate limit slot, are left blank.
+    
+    Returns:
+        List of Quote records; a LocalResult if no call could be made
+        
+    Raises:
+        UpstreamError: If the quote request failed
+    """
     try:
+        api_key = rate_limiter.acquire("fmp", deadline=deadline, block=False)
+        if api_key is None:
+            logger.warning("FMP rate limit: no slot available for quote request")
+            return LocalResult()
+        
         if symbols:
             symbols_str = ",".join(symbols)
-            url = f"https://financialmodelingprep.com/api/v3/quote/{symbols_str}?apikey={FMP_API_KEY}"
+            url = f"{FMP_BASE_URL}/quote/{symbols_str}"
         else:
-            url = f"https://financialmodelingprep.com/api/v3/stock/gainers?apikey={FMP_API_KEY}"
+            url = f"{FMP_BASE_URL}/stock/gainers"
         
-        response = requests.get(url)
-        data = response.json()
+        data = get_json("fmp", url, params={"apikey": api_key}, deadline=deadline)
         
         results = []
         
-        # Get additional profile data for sectors and industries
+        # Get additional profile data for sectors and industries, concurrently
+        profile_symbols = [item.get("symbol") for item in data[:limit] if item.get("symbol")]
         profiles = {}
-        for item in data[:limit]:
-            symbol = item.get("symbol")
-            if symbol:
-                try:
-                    profile_url = f"https://financialmodelingprep.com/api/v3/profile/{symbol}?apikey={FMP_API_KEY}"
-                    profile_response = requests.get(profile_url)
-                    profile_data = profile_response.json()
-                    
-                    if profile_data and isinstance(profile_data, list) and len(profile_data) > 0:
-                        profiles[symbol] = {
-                            "name": profile_data[0].get("companyName", ""),
-                            "sector": profile_data[0].get("sector", ""),
-                            "industry": profile_data[0].get("industry", ""),
-                            "marketCap": profile_data[0].get("mktCap", 0)
-                        }
-                    else:
-                        profiles[symbol] = {"name": "", "sector": "", "industry": "", "marketCap": 0}
-                except Exception as e:
-                    logger.warning(f"Error fetching profile data for {symbol}: {str(e)}")
-                    profiles[symbol] = {"name": "", "sector": "", "industry": "", "marketCap": 0}
+        fetch_profile = functools.partial(_get_fmp_profile, deadline=deadline)
+        for symbol, profile, error in fan_out(fetch_profile, profile_symbols, provider="fmp"):
+            if error is not None:
+                logger.warning(f"Error fetching profile data for {symbol}: {str(error)}")
+                profiles[symbol] = {"name": "", "sector": "", "industry": "", "marketCap": 0}
+            else:
+                profiles[symbol] = profile
         
         for item in data[:limit]:
             symbol = item.get("symbol")
-            if symbol in profiles:
-                results.append({
-                    "symbol": symbol,
-                    "name": profiles[symbol]["name"],
-                    "price": float(item.get("price", 0)),
-                    "change": float(item.get("change", 0)),
-                    "change_percent": float(item.get("changesPercentage", 0)),
-                    "volume": int(item.get("volume", 0)),
-                    "marketCap": profiles[symbol]["marketCap"],
-                    "sector": profiles[symbol]["sector"],
-                    "industry": profiles[symbol]["industry"],
-                    "latest_trading_day": item.get("date", datetime.now().strftime("%Y-%m-%d"))
-                })
-            else:
-                results.append({
-                    "symbol": symbol,
-                    "name": "",
-                    "price": float(item.get("price", 0)),
-                    "change": float(item.get("change", 0)),
-                    "change_percent": float(item.get("changesPercentage", 0)),
-                    "volume": int(item.get("volume", 0)),
-                    "marketCap": 0,
-                    "sector": "",
-                    "industry": "",
-                    "latest_trading_day": item.get("date", datetime.now().strftime("%Y-%m-%d"))
-                })
+            profile = profiles.get(symbol, {"name": "", "sector": "", "industry": "", "marketCap": 0})
+            results.append(Quote(
+                symbol,
+                name=profile["name"],
+                price=float(item.get("price", 0)),
+                change=float(item.get("change", 0)),
+                change_percent=float(item.get("changesPercentage", 0)),
+                volume=int(item.get("volume", 0)),
+                marketCap=profile["marketCap"],
+                sector=profile["sector"],
+                industry=profile["industry"],
+                latest_trading_day=item.get("date", datetime.now().strftime("%Y-%m-%d"))
+            ))
         
         return results
     except Exception as e:
-        logger.error(f"Error fetching FMP data: {str(e)}")
-        return []
+        raise UpstreamError(f"Error fetching FMP data: {str(e)}") from e
 
-def get_fmp_sectors():
+def get_fmp_sectors(deadline=None):
     """Fetch sector performance data from Financial Modeling Prep API"""
     try:
-        url = f"https://financialmodelingprep.com/api/v3/stock/sectors-performance?apikey={FMP_API_KEY}"
+        api_key = rate_limiter.acquire("fmp", deadline=deadline, block=False)
+        if api_key is None:
+            logger.warning("FMP rate limit: no slot available for sector request")
+            return []
         
-        response = requests.get(url)
-        data = response.json()
+        data = get_json("fmp", f"{FMP_BASE_URL}/stock/sectors-performance", params={"apikey": api_key},
+                        deadline=deadline)
         
         if "sectorPerformance" in data:
             return data["sectorPerformance"]
@@ -392,8 +383,22 @@ def get_fmp_sectors():
         logger.error(f"Error fetching FMP sector data: {str(e)}")
         return []
 
+# Daily bar columns as returned by yfinance, and the names we use for them
+HISTORY_COLUMNS = {"Open": "open", "High": "high", "Low": "low", "Close": "close", "Volume": "volume"}
+
 def get_yahoo_historical(symbols, start_date, end_date):
-    """Get historical data from Yahoo Finance"""
+    """
+    Get historical data from Yahoo Finance
+    
+    Args:
+        symbols: List of stock symbols
+        start_date: First day to fetch
+        end_date: Day after the last day to fetch
+        
+    Returns:
+        Dictionary of DataFrames by symbol, indexed by date with open, high,
+        low, close and volume columns
+    """
     try:
         # Format dates for yfinance
         start_str = start_date.strftime('%Y-%m-%d')
@@ -403,89 +408,239 @@ def get_yahoo_historical(symbols, start_date, end_date):
         symbols_str = " ".join(symbols)
         
         # Download historical data
-        data = yf.download(symbols_str, start=start_str, end=end_str, group_by="ticker")
+        data = yf.download(symbols_str, start=start_str, end=end_str, group_by="ticker", timeout=HTTP_READ_TIMEOUT)
         
         results = {}
         
-        # Process data based on number of symbols
-        if len(symbols) == 1:
-            symbol = symbols[0]
-            df = pd.DataFrame({
-                'date': data.index.strftime('%Y-%m-%d').tolist(),
-                'open': data['Open'].tolist(),
-                'high': data['High'].tolist(),
-                'low': data['Low'].tolist(),
-                'close': data['Close'].tolist(),
-                'volume': data['Volume'].tolist()
-            })
-            results[symbol] = df.to_dict('records')
-        else:
-            for symbol in symbols:
-                if symbol in data:
-                    symbol_data = data[symbol]
-                    df = pd.DataFrame({
-                        'date': symbol_data.index.strftime('%Y-%m-%d').tolist(),
-                        'open': symbol_data['Open'].tolist(),
-                        'high': symbol_data['High'].tolist(),
-                        'low': symbol_data['Low'].tolist(),
-                        'close': symbol_data['Close'].tolist(),
-                        'volume': symbol_data['Volume'].tolist()
-                    })
-                    results[symbol] = df.to_dict('records')
+        # Grouped columns are (symbol, field); a single symbol may come back flat
+        grouped = isinstance(data.columns, pd.MultiIndex)
+        for symbol in symbols:
+            if grouped and symbol in data.columns.get_level_values(0):
+                symbol_data = data[symbol]
+            elif not grouped and len(symbols) == 1:
+                symbol_data = data
+            else:
+                continue
+            results[symbol] = symbol_data[list(HISTORY_COLUMNS)].rename(columns=HISTORY_COLUMNS)
         
         return results
     except Exception as e:
         logger.error(f"Error fetching Yahoo Finance historical data: {str(e)}")
         return {}
 
+# Version-keyed cache keys written by the last publish_universe call
+_published_keys = set()
+_published_keys_lock = Lock()
+
 # Main functions for API endpoints
-def get_stock_data(symbols=None, limit=30):
-    """Get stock data from available sources, trying each in turn"""
+def get_stock_data(symbols=None, limit=30, deadline=None):
+    """Get processed stock data from available sources, trying each in turn"""
+    # Process data for heatmap visualization
+    return process_stock_data(get_stock_quotes(symbols, limit, deadline))
+
+# Quote providers in order of preference: Yahoo Finance is the most reliable
+# free source, Alpha Vantage and FMP are fallbacks
+QUOTE_PROVIDERS = ["yahoo", "alpha_vantage", "fmp"]
+
+register_provider("yahoo", _yahoo_provider)
+register_provider("alpha_vantage", lambda symbols, limit, deadline=None: get_alpha_vantage_data(symbols, deadline=deadline))
+register_provider("fmp", get_fmp_data)
+
+def get_stock_quotes(symbols=None, limit=30, deadline=None):
+    """
+    Get raw stock quotes from the first healthy provider that returns data
+    
+    Providers with an open circuit breaker are skipped, and a provider that
+    is slower than usual is hedged with the next one. A hedge that covers
+    only some of the symbols fills in for the slow provider instead of
+    replacing its answer.
+    
+    Args:
+        symbols: List of stock symbols (default: the first `limit` default symbols)
+        limit: Number of stocks
+        deadline: time.monotonic() value to stop waiting for providers at (optional)
+    """
     if symbols is None or len(symbols) == 0:
         symbols = DEFAULT_SYMBOLS[:limit]
     
-    # Try Yahoo Finance first (most reliable free source)
-    data = get_yahoo_finance_data(symbols)
+    return fetch_with_failover(QUOTE_PROVIDERS, symbols, limit, deadline=deadline, wanted=symbols)
+
+def get_quotes_within(symbols, limit=30, deadline=None):
+    """
+    Get quotes for the symbols of a request, never waiting past its deadline
+    
+    Symbols no provider resolved in time are filled from their last known
+    quotes, or left out if there is none.
     
-    # If Yahoo Finance failed, try Alpha Vantage
-    if not data:
-        data = get_alpha_vantage_data(symbols)
+    Args:
+        symbols: List of stock symbols (default: the first `limit` default symbols)
+        limit: Number of stocks
+        deadline: time.monotonic() value to stop waiting for providers at (optional)
+        
+    Returns:
+        Tuple of (quotes, symbols served from an older quote, missing symbols)
+    """
+    symbols = symbols or DEFAULT_SYMBOLS[:limit]
+    return fill_unresolved(symbols, get_stock_quotes(symbols, limit, deadline))
+
+def get_yahoo_quotes_within(symbols, deadline=None):
+    """
+    Get Yahoo Finance quotes for a request, never waiting past its deadline
     
-    # If Alpha Vantage failed, try FMP
-    if not data:
-        data = get_fmp_data(symbols, limit)
+    Used where only Yahoo has the sector data a view needs. A download still
+    running at the deadline finishes in the background and fills the quote
+    store; symbols it did not resolve in time are filled from their last
+    known quotes, or left out if there is none.
     
-    # Process data for heatmap visualization
-    return process_stock_data(data)
+    Args:
+        symbols: List of stock symbols
+        deadline: time.monotonic() value to stop waiting at (optional)
+        
+    Returns:
+        Tuple of (quotes, symbols served from an older quote, missing symbols)
+    """
+    return fill_unresolved(symbols, fetch_with_failover(["yahoo"], symbols, len(symbols), deadline=deadline))
 
-def get_sector_data(sector=None, limit=30):
+def get_sector_data(sector=None, limit=30, deadline=None):
     """Get sector performance data"""
     # Get sector data from FMP
-    sector_data = get_fmp_sectors()
+    sector_data = get_fmp_sectors(deadline)
     
     # Process sector data for heatmap visualization
     return process_sector_data(sector_data, sector, limit)
 
-def get_historical_data(symbols, start_date, end_date):
-    """Get historical stock data for selected symbols"""
-    # Get historical data from Yahoo Finance
-    data = get_yahoo_historical(symbols, start_date, end_date)
+def get_historical_data(symbols, start_date, end_date, orient="records"):
+    """
+    Get historical stock data for selected symbols
+    
+    Args:
+        symbols: List of stock symbols
+        start_date: First day to fetch
+        end_date: Day after the last day to fetch
+        orient: "records" for one dict per day, "columns" for arrays per field
+    """
+    # Get historical data from the local store, fetching only missing days from Yahoo Finance
+    data = get_history(symbols, start_date, end_date, fetch=get_yahoo_historical)
     
     # Process historical data for visualization
-    return process_historical_data(data)
+    return process_historical_data(data, orient=orient)
+
+def iter_historical_data(symbols, start_date, end_date, orient="records", chunk_size=None):
+    """
+    Get processed historical data one chunk of symbols at a time
+
+    Each chunk is read from the local store (fetching only its missing days)
+    and processed before the next one is started, so at most one chunk of
+    output is held in memory.
+
+    Args:
+        symbols: List of stock symbols
+        start_date: First day to fetch
+        end_date: Day after the last day to fetch
+        orient: "records" for one dict per day, "columns" for arrays per field
+        chunk_size: Symbols per chunk (default: HISTORICAL_CHUNK_SIZE)
+
+    Yields:
+        Tuples of (symbol, processed history with stats)
+    """
+    chunk_size = chunk_size or HISTORICAL_CHUNK_SIZE
+    for i in range(0, len(symbols), chunk_size):
+        chunk = symbols[i:i + chunk_size]
+        data = get_history(chunk, start_date, end_date, fetch=get_yahoo_historical)
+        processed = process_historical_data(data, orient=orient)
+        if "error" in processed:
+            raise ValueError(processed["error"])
+        yield from processed["symbols"].items()
+
+def snapshot_event(snapshot):
+    """
+    Build the full heat map payload of the stream symbols for a published snapshot
+
+    Args:
+        snapshot: data.versions.SnapshotVersion
+
+    Returns:
+        Dictionary with the version and the stocks grouped by sector
+    """
+    items = [snapshot.quotes[symbol] for symbol in STREAM_SYMBOLS if symbol in snapshot.quotes]
+    return {
+        "version": snapshot.version,
+        "sectors": process_stocks_by_sector({"items": items}),
+        "timestamp": datetime.now().isoformat()
+    }
+
+def refresh_quotes(symbols):
+    """
+    Fetch quotes from Yahoo Finance even if stored ones are still fresh
+    
+    Args:
+        symbols: List of stock symbols
+        
+    Returns:
+        List of fetched Quote records, empty if the download failed
+    """
+    try:
+        fetched = _download_yahoo_quotes(symbols)
+    except Exception as e:
+        logger.error(f"Error refreshing Yahoo Finance quotes: {str(e)}")
+        return []
+    store_quotes(fetched, requested=symbols)
+    return fetched
+
+def publish_universe(quotes, sector_data=None):
+    """
+    Publish quotes of the default universe as a new snapshot version
+    
+    Every default route view is built from the snapshot and written to the
+    cache together under the keys the routes look up, the screener indexes
+    are updated, then the change is pushed to open event streams. Views of
+    the previous version that no route looks up anymore are evicted.
+    
+    Args:
+        quotes: List of Quote records for the default universe
+        sector_data: Processed sector performance to publish for /sectors (optional)
+        
+    Returns:
+        The new version number
+    """
+    previous = latest_snapshot()
+    version = publish_snapshot(DEFAULT_SYMBOLS, quotes)
+    update_index(quotes, version)
+    
+    views = materialize_views(DEFAULT_SYMBOLS, quotes, version, sector_data)
+    cache_many(views)
+    
+    # Views keyed by the previous version are superseded now; the others
+    # were overwritten or, like /sectors, are not part of every publish
+    keys = {view[0] for view in views if str(version) in view[0]}
+    with _published_keys_lock:
+        superseded = _published_keys - keys
+        _published_keys.clear()
+        _published_keys.update(keys)
+    delete_cached(superseded)
+    
+    # Push the new version to open event streams
+    delta = snapshot_delta(previous.version, STREAM_SYMBOLS) if previous else None
+    if delta is not None:
+        publish_event("delta", process_sector_delta(delta), event_id=version)
+    else:
+        publish_event("snapshot", snapshot_event(latest_snapshot()), event_id=version)
+    
+    logger.debug(f"Published version {version} with {len(views)} views")
+    return version
 
 def update_stock_data():
-    """Update cached stock data - called by scheduler"""
+    """Refresh the whole default universe in one batch and publish it - called at startup"""
     logger.info("Scheduled update: Refreshing stock data")
     try:
-        # Update main stocks data
-        data = get_stock_data()
-        cache_data("stocks_default", data, timeout=3600)
+        quotes = get_yahoo_finance_data(DEFAULT_SYMBOLS)
+        if not quotes:
+            logger.warning("Scheduled update: no quotes received, keeping the current views")
+            return
         
-        # Update sector data
-        sector_data = get_sector_data()
-        cache_data("sectors_data", sector_data, timeout=3600)
+        # Sector performance comes from its own upstream endpoint
+        version = publish_universe(quotes, get_sector_data(limit=100))
         
-        logger.info("Stock data successfully updated")
+        logger.info(f"Stock data successfully updated: version {version}")
     except Exception as e:
         logger.error(f"Error in scheduled stock data update: {str(e)}")
@@ -0,0 +1,96 @@
+import os
+import time
+import logging
+from collections import deque, namedtuple
+from threading import Lock
+
+# Configure module logger
+logger = logging.getLogger(__name__)
+
+# Number of recent snapshot versions kept for computing deltas
+SNAPSHOT_VERSIONS_KEPT = int(os.environ.get("SNAPSHOT_VERSIONS_KEPT", 12))
+
+# A published quote snapshot: universe is the set of symbols that was
+# requested, quotes holds the Quote records received, by symbol
+SnapshotVersion = namedtuple("SnapshotVersion", ["version", "created_at", "universe", "quotes"])
+
+# Ring of recent snapshots, oldest first
+_versions = deque(maxlen=SNAPSHOT_VERSIONS_KEPT)
+_versions_lock = Lock()
+
+def publish_snapshot(symbols, quotes):
+    """
+    Publish a new quote snapshot under the next version
+
+    Versions are millisecond timestamps bumped to stay strictly increasing,
+    so they also keep increasing across restarts.
+
+    Args:
+        symbols: Symbols the snapshot was fetched for
+        quotes: List of Quote records
+
+    Returns:
+        The new version number
+    """
+    with _versions_lock:
+        last = _versions[-1].version if _versions else 0
+        version = max(last + 1, int(time.time() * 1000))
+        _versions.append(SnapshotVersion(
+            version, time.time(), frozenset(symbols), {quote.symbol: quote for quote in quotes}
+        ))
+
+    logger.debug(f"Published snapshot version {version} with {len(quotes)} quotes")
+    return version
+
+def latest_snapshot(symbols=None):
+    """
+    Get the most recent snapshot
+
+    Args:
+        symbols: Symbols the snapshot must cover (optional)
+
+    Returns:
+        SnapshotVersion, or None if nothing covering the symbols was published
+    """
+    with _versions_lock:
+        latest = _versions[-1] if _versions else None
+
+    if latest is None or (symbols is not None and not latest.universe.issuperset(symbols)):
+        return None
+    return latest
+
+def snapshot_delta(since, symbols):
+    """
+    Get the quotes that changed between a previous version and the latest one
+
+    A quote counts as changed when its price or change percentage moved or
+    when the symbol is new since that version.
+
+    Args:
+        since: Version the client already has
+        symbols: Symbols the client is interested in
+
+    Returns:
+        Dictionary with "version", "since", "changed" (Quote records)
+        and "removed" (symbols), or None if the version is no longer kept
+        or the latest snapshot does not cover the symbols
+    """
+    with _versions_lock:
+        base = next((snapshot for snapshot in _versions if snapshot.version == since), None)
+        latest = _versions[-1] if _versions else None
+
+    if base is None or not latest.universe.issuperset(symbols):
+        return None
+
+    changed = []
+    removed = []
+    for symbol in symbols:
+        old = base.quotes.get(symbol)
+        new = latest.quotes.get(symbol)
+        if new is None:
+            if old is not None:
+                removed.append(symbol)
+        elif old is None or old.price != new.price or old.change_percent != new.change_percent:
+            changed.append(new)
+
+    return {"version": latest.version, "since": since, "changed": changed, "removed": removed}
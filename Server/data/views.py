@@ -0,0 +1,238 @@
+import os
+import logging
+from datetime import datetime
+from data.snapshot import MarketSnapshot
+from data.processors import (process_stock_data, process_stocks_by_sector, stock_columns, stocks_by_sector_columns,
+                             process_movers, process_sector_movers)
+from utils.http_cache import encode_json, encode_columns, available_formats
+
+# Configure module logger
+logger = logging.getLogger(__name__)
+
+# Route defaults, shared by the routes and the precompute job so both use the same cache keys
+STOCKS_DEFAULT_LIMIT = 30
+STOCKS_BY_SECTOR_DEFAULT_LIMIT = 100
+SCREENER_DEFAULT_LIMIT = 50
+MOVERS_DEFAULT_LIMIT = 10
+DEFAULT_LARGE_CAP_THRESHOLD = 100000000000
+SECTORS_CACHE_KEY = "sectors_data"
+
+# Time budget of a request for upstream calls, in seconds; requests can ask
+# for a different one with ?deadline= between MIN_ and MAX_REQUEST_DEADLINE_SECONDS
+REQUEST_DEADLINE_SECONDS = float(os.environ.get("REQUEST_DEADLINE_SECONDS", 5))
+MIN_REQUEST_DEADLINE_SECONDS = float(os.environ.get("MIN_REQUEST_DEADLINE_SECONDS", 1))
+MAX_REQUEST_DEADLINE_SECONDS = float(os.environ.get("MAX_REQUEST_DEADLINE_SECONDS", 30))
+
+# Large-cap thresholds precomputed for /stocks-by-sector, comma-separated
+PRECOMPUTED_LARGE_CAP_THRESHOLDS = [
+    int(float(threshold))
+    for threshold in os.environ.get("PRECOMPUTED_LARGE_CAP_THRESHOLDS", "100000000000,10000000000").split(",")
+]
+
+# Soft and hard cache timeouts per view, in seconds
+VIEW_TTLS = {
+    "stocks": (300, 1800),
+    "sectors": (900, 3600),
+    "stocks_by_sector": (300, 3600),
+    "movers": (300, 1800),
+}
+# Responses with stale or missing symbols are only cached briefly
+PARTIAL_VIEW_TTLS = (int(os.environ.get("PARTIAL_VIEW_TTL", 15)), 60)
+
+def partial_view_ttls(encoded):
+    """Cache timeouts for get_or_compute: short ones for partial views, else the defaults"""
+    return PARTIAL_VIEW_TTLS if encoded.partial else None
+
+def stocks_cache_key(symbols, sector, limit, output_format="json"):
+    """
+    Cache key of a /stocks response
+
+    Args:
+        symbols: Normalized comma-separated symbols or None
+        sector: Sector filter or None
+        limit: Number of stocks
+        output_format: "json", "arrow" or "msgpack"
+    """
+    key = f"stocks_{symbols}_{sector}_{limit}"
+    return key if output_format == "json" else f"{key}_{output_format}"
+
+def stocks_by_sector_cache_key(symbols, limit, large_cap_threshold, version, output_format="json", top=None):
+    """
+    Cache key of a /stocks-by-sector response; each snapshot version gets its own key
+
+    Args:
+        symbols: Normalized comma-separated symbols or None
+        limit: Number of stocks
+        large_cap_threshold: Market cap threshold for the isLarge flag
+        version: Snapshot version the response is built from, or None
+        output_format: "json", "arrow" or "msgpack"
+        top: Maximum number of stocks per sector, or None for all
+    """
+    key = f"stocks_by_sector_{symbols}_{limit}_{large_cap_threshold}_{version}"
+    if top is not None:
+        key = f"{key}_top{top}"
+    return key if output_format == "json" else f"{key}_{output_format}"
+
+def movers_cache_key(sector, limit, version):
+    """
+    Cache key of a /movers response; each snapshot version gets its own key
+
+    Args:
+        sector: Normalized (upper-case) sector or None for the whole universe
+        limit: Number of gainers and of losers
+        version: Snapshot version the response is built from, or None
+    """
+    return f"movers_{sector}_{limit}_{version}"
+
+def _unresolved(stale, missing):
+    """Fields listing the symbols a partial response is stale or missing for"""
+    if not stale and not missing:
+        return {}
+    return {"stale": list(stale), "missing": list(missing)}
+
+def _add_metadata(columns, fields):
+    # Binary schema metadata holds strings only, so lists are comma-separated
+    columns["metadata"].update((key, ",".join(value)) for key, value in fields.items())
+    return columns
+
+def encode_stocks_view(quotes, output_format="json", stale=(), missing=()):
+    """
+    Build and encode a /stocks response
+
+    Args:
+        quotes: List of Quote records or a MarketSnapshot
+        output_format: "json", "arrow" or "msgpack"
+        stale: Symbols served from an older quote (optional)
+        missing: Requested symbols without any quote (optional)
+
+    Returns:
+        EncodedResponse, flagged as partial if any symbol is stale or missing
+    """
+    unresolved = _unresolved(stale, missing)
+    if output_format == "json":
+        encoded = encode_json({**process_stock_data(quotes), **unresolved})
+    else:
+        encoded = encode_columns(_add_metadata(stock_columns(quotes), unresolved), output_format)
+    encoded.partial = bool(unresolved)
+    return encoded
+
+def encode_stocks_by_sector_view(quotes, large_cap_threshold, version, output_format="json", stale=(), missing=(),
+                                 top=None):
+    """
+    Build and encode a /stocks-by-sector response
+
+    Args:
+        quotes: List of Quote records or a MarketSnapshot
+        large_cap_threshold: Market cap threshold for the isLarge flag
+        version: Snapshot version the quotes come from, or None
+        output_format: "json", "arrow" or "msgpack"
+        stale: Symbols served from an older quote (optional)
+        missing: Requested symbols without any quote (optional)
+        top: Maximum number of stocks per sector, the largest ones (optional)
+
+    Returns:
+        EncodedResponse, flagged as partial if any symbol is stale or missing
+    """
+    snapshot = quotes if isinstance(quotes, MarketSnapshot) else MarketSnapshot.from_items(quotes)
+    unresolved = _unresolved(stale, missing)
+
+    if output_format == "json":
+        encoded = encode_json({
+            "sectors": process_stocks_by_sector(snapshot, large_cap_threshold=large_cap_threshold, limit=top),
+            "version": version,
+            "timestamp": datetime.now().isoformat(),
+            **unresolved
+        })
+    else:
+        columns = stocks_by_sector_columns(snapshot, large_cap_threshold=large_cap_threshold, limit=top)
+        columns["metadata"]["version"] = version
+        encoded = encode_columns(_add_metadata(columns, unresolved), output_format)
+    encoded.partial = bool(unresolved)
+    return encoded
+
+def _encode_movers(movers, sector, version, unresolved=None):
+    encoded = encode_json({
+        **movers,
+        "sector": sector,
+        "version": version,
+        "timestamp": datetime.now().isoformat(),
+        **(unresolved or {})
+    })
+    encoded.partial = bool(unresolved)
+    return encoded
+
+def encode_movers_view(quotes, limit, version, sector=None, stale=(), missing=()):
+    """
+    Build and encode a /movers response
+
+    Args:
+        quotes: List of Quote records or a MarketSnapshot
+        limit: Number of gainers and of losers
+        version: Snapshot version the quotes come from, or None
+        sector: Normalized sector to restrict the movers to (optional)
+        stale: Symbols served from an older quote (optional)
+        missing: Requested symbols without any quote (optional)
+
+    Returns:
+        EncodedResponse, flagged as partial if any symbol is stale or missing
+    """
+    return _encode_movers(process_movers(quotes, limit, sector), sector, version, _unresolved(stale, missing))
+
+def materialize_views(universe, quotes, version, sector_data):
+    """
+    Build every default route view from one fetch of the universe
+
+    The universe is turned into a single MarketSnapshot; the default /stocks
+    and /stocks-by-sector universes are prefixes of it, so each view is a
+    slice of that snapshot rather than a new fetch. The default /movers view
+    is built for the whole universe and for every sector, so those requests
+    never select over the universe themselves.
+
+    Args:
+        universe: Symbols of the universe, in order (DEFAULT_SYMBOLS)
+        quotes: List of Quote records fetched for the universe
+        version: Snapshot version the quotes were published under
+        sector_data: Processed sector performance for /sectors, or None to
+            leave the cached sectors view alone
+
+    Returns:
+        List of (cache key, EncodedResponse, ttl, hard_ttl) tuples
+    """
+    by_symbol = {quote.symbol: quote for quote in quotes}
+    items = [by_symbol[symbol] for symbol in universe if symbol in by_symbol]
+    snapshot = MarketSnapshot.from_items(items)
+
+    def first(limit):
+        # Rows of the first `limit` universe symbols that have a quote
+        count = sum(1 for symbol in universe[:limit] if symbol in by_symbol)
+        return snapshot.take(list(range(count)))
+
+    formats = ["json"] + available_formats()
+    views = []
+
+    stocks = first(STOCKS_DEFAULT_LIMIT)
+    for output_format in formats:
+        views.append((stocks_cache_key(None, None, STOCKS_DEFAULT_LIMIT, output_format),
+                      encode_stocks_view(stocks, output_format), *VIEW_TTLS["stocks"]))
+
+    by_sector = first(STOCKS_BY_SECTOR_DEFAULT_LIMIT)
+    for threshold in PRECOMPUTED_LARGE_CAP_THRESHOLDS:
+        for output_format in formats:
+            key = stocks_by_sector_cache_key(None, STOCKS_BY_SECTOR_DEFAULT_LIMIT, threshold, version, output_format)
+            views.append((key, encode_stocks_by_sector_view(by_sector, threshold, version, output_format),
+                          *VIEW_TTLS["stocks_by_sector"]))
+
+    # The universe lists a few symbols twice; movers list every stock once
+    unique = MarketSnapshot.from_items([by_symbol[symbol] for symbol in dict.fromkeys(universe) if symbol in by_symbol])
+    ttl, hard_ttl = VIEW_TTLS["movers"]
+    views.append((movers_cache_key(None, MOVERS_DEFAULT_LIMIT, version),
+                  encode_movers_view(unique, MOVERS_DEFAULT_LIMIT, version), ttl, hard_ttl))
+    for sector, movers in process_sector_movers(unique, MOVERS_DEFAULT_LIMIT).items():
+        views.append((movers_cache_key(sector, MOVERS_DEFAULT_LIMIT, version),
+                      _encode_movers(movers, sector, version), ttl, hard_ttl))
+
+    if sector_data and sector_data.get("sectors"):
+        views.append((SECTORS_CACHE_KEY, encode_json(sector_data), *VIEW_TTLS["sectors"]))
+
+    logger.debug(f"Materialized {len(views)} views for snapshot version {version}")
+    return views
@@ -1,63 +1,247 @@
+import os
 import time
 import logging
-from threading import Lock
+from threading import Lock, Event, Thread
+from utils.cache_backends import create_backend
 
 # Configure module logger
 logger = logging.getLogger(__name__)
 
-# Simple in-memory cache
-_cache = {}
+# Budget for cached data in bytes; least recently used entries are evicted first
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# Cache storage: "memory" for a per-process LRU, "sqlite" to share one cache
+# between all worker processes on the host
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+
+# Entries are fresh until timeout, may be served stale until hard_timeout
+_backend = create_backend(CACHE_BACKEND, CACHE_MAX_BYTES)
 _cache_lock = Lock()
 
+# Computations in progress, by key, for single-flight coalescing
+_inflight = {}
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "expirations": 0,
+    "computes": 0,
+    "coalesced_waiters": 0,
+    "stale_served": 0,
+    "background_refreshes": 0,
+}
+
+class _Flight:
+    """A computation in progress that other callers can wait on"""
+
+    def __init__(self):
+        self.event = Event()
+        self.result = None
+        self.error = None
+
+def set_cache_backend(backend):
+    """
+    Replace the cache storage backend
+
+    Args:
+        backend: utils.cache_backends.CacheBackend instance
+    """
+    global _backend
+    with _cache_lock:
+        _backend = backend
+
+def _lookup(key, allow_stale=False, count=True):
+    """
+    Look up a cache entry
+
+    The backend is read without holding _cache_lock, so a slow read (e.g.
+    from the shared SQLite cache) never holds up other requests; only the
+    counters are updated under it.
+
+    Args:
+        key: Cache key
+        allow_stale: Also return entries past their soft timeout
+        count: Count the lookup as a hit or miss
+
+    Returns:
+        Tuple of (data, is_stale), data is None if not found/expired
+    """
+    data, is_stale, expired = None, False, False
+    entry = _backend.get(key)
+    if entry is not None:
+        timestamp, timeout, hard_timeout, value = entry
+        age = time.time() - timestamp
+        if age < timeout or (allow_stale and age < hard_timeout):
+            data, is_stale = value, age >= timeout
+        elif age >= hard_timeout:
+            # Clean up expired cache entry
+            _backend.delete(key)
+            expired = True
+
+    if count or expired:
+        with _cache_lock:
+            if count:
+                _stats["hits" if data is not None else "misses"] += 1
+            if expired:
+                _stats["expirations"] += 1
+    return data, is_stale
+
 def get_cached_data(key):
     """
     Get data from cache if it exists and hasn't expired
-    
+
     Args:
         key: Cache key
-        
+
     Returns:
         Cached data or None if not found/expired
     """
+    return _lookup(key)[0]
+
+def _compute(key, flight, fn, ttl, hard_ttl, ttl_for=None):
+    """Run fn for a flight, cache the result and release any waiters"""
+    try:
+        flight.result = fn()
+        ttls = ttl_for(flight.result) if ttl_for is not None else None
+        if ttls is not None:
+            ttl, hard_ttl = ttls
+        cache_data(key, flight.result, timeout=ttl, hard_timeout=hard_ttl)
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _cache_lock:
+            _inflight.pop(key, None)
+        flight.event.set()
+
+def _background_refresh(key, flight, fn, ttl, hard_ttl, ttl_for):
+    """Refresh a stale entry without blocking any request"""
+    try:
+        _compute(key, flight, fn, ttl, hard_ttl, ttl_for)
+        logger.debug(f"Background refresh of {key} complete")
+    except Exception as e:
+        logger.error(f"Background refresh of {key} failed: {str(e)}")
+
+def get_or_compute(key, fn, ttl=300, hard_ttl=None, ttl_for=None):
+    """
+    Get data from cache, computing it with fn on a miss
+
+    Only one caller computes a missing key; concurrent callers for the same
+    key wait for that result instead of starting their own computation.
+
+    Between ttl and hard_ttl the stale value is returned right away and a
+    single background refresh is started for the key. Only after hard_ttl
+    does a caller block on the computation.
+
+    Args:
+        key: Cache key
+        fn: Function without arguments returning the data to cache
+        ttl: Soft cache timeout in seconds (default: 5 minutes)
+        hard_ttl: Hard cache timeout in seconds (default: same as ttl)
+        ttl_for: Function returning (ttl, hard_ttl) for a computed result, or
+            None to keep the defaults, e.g. to cache partial results briefly
+
+    Returns:
+        Cached or freshly computed data
+    """
+    hard_ttl = max(ttl, hard_ttl or ttl)
+
+    data, is_stale = _lookup(key, allow_stale=True)
     with _cache_lock:
-        if key in _cache:
-            timestamp, timeout, data = _cache[key]
-            if time.time() - timestamp < timeout:
-                return data
-            else:
-                # Clean up expired cache entry
-                del _cache[key]
-    return None
+        flight = _inflight.get(key)
+
+        if data is not None and is_stale:
+            _stats["stale_served"] += 1
+            if flight is None:
+                flight = _inflight[key] = _Flight()
+                _stats["background_refreshes"] += 1
+                Thread(target=_background_refresh, args=(key, flight, fn, ttl, hard_ttl, ttl_for),
+                       name=f"refresh-{key}", daemon=True).start()
+        if data is not None:
+            return data
+
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+            _stats["computes"] += 1
+        else:
+            _stats["coalesced_waiters"] += 1
 
-def cache_data(key, data, timeout=300):
+    if not leader:
+        logger.debug(f"Waiting for in-flight computation of {key}")
+        flight.event.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    # A computation that finished between the lookup and taking the lock has
+    # cached its result by now; serve that rather than computing it again
+    data, _ = _lookup(key, count=False)
+    if data is not None:
+        flight.result = data
+        with _cache_lock:
+            _inflight.pop(key, None)
+        flight.event.set()
+        return data
+
+    return _compute(key, flight, fn, ttl, hard_ttl, ttl_for)
+
+def get_cache_stats():
+    """Get cache size, hit/miss/eviction, single-flight and stale-while-revalidate counters"""
+    backend_stats = _backend.stats()
+    with _cache_lock:
+        return dict(_stats, inflight=len(_inflight), **backend_stats)
+
+def cache_data(key, data, timeout=300, hard_timeout=None):
     """
     Cache data with expiration
-    
+
     Args:
         key: Cache key
         data: Data to cache
         timeout: Cache timeout in seconds (default: 5 minutes)
+        hard_timeout: Time in seconds the entry may be served stale (default: timeout)
     """
-    with _cache_lock:
-        _cache[key] = (time.time(), timeout, data)
-    
+    _backend.set(key, time.time(), timeout, max(timeout, hard_timeout or timeout), data)
+
+def cache_many(entries):
+    """
+    Cache several entries atomically
+
+    Backends store them together: readers in this process see either none
+    or all of the new entries, and the SQLite backend writes them in one
+    transaction for other workers.
+
+    Args:
+        entries: List of (key, data, timeout, hard_timeout) tuples
+    """
+    now = time.time()
+    rows = [
+        (key, now, timeout, max(timeout, hard_timeout or timeout), data)
+        for key, data, timeout, hard_timeout in entries
+    ]
+    _backend.set_many(rows)
+
+def delete_cached(keys):
+    """
+    Remove entries from the cache
+
+    Args:
+        keys: Cache keys to remove; keys that are not cached are ignored
+    """
+    for key in keys:
+        _backend.delete(key)
+
 def clear_cache():
     """Clear all cached data"""
-    with _cache_lock:
-        _cache.clear()
+    _backend.clear()
     logger.info("Cache cleared")
 
 def cleanup_expired_cache():
-    """Remove expired cache entries"""
+    """Remove expired cache entries - called by scheduler"""
+    expired = _backend.expire(time.time())
     with _cache_lock:
-        current_time = time.time()
-        expired_keys = [
-            key for key, (timestamp, timeout, _) in _cache.items()
-            if current_time - timestamp >= timeout
-        ]
-        
-        for key in expired_keys:
-            del _cache[key]
-    
-    if expired_keys:
-        logger.debug(f"Cleaned up {len(expired_keys)} expired cache entries")
+        _stats["expirations"] += expired
+
+    if expired:
+        logger.debug(f"Cleaned up {expired} expired cache entries")
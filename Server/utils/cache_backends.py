@@ -0,0 +1,276 @@
+import os
+import sys
+import time
+import pickle
+import sqlite3
+import logging
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from utils.http_cache import EncodedResponse
+
+# Configure module logger
+logger = logging.getLogger(__name__)
+
+# Pickle protocol 5 keeps large bytes/array payloads out-of-band friendly and fast
+PICKLE_PROTOCOL = 5
+
+def estimate_size(obj, depth=0):
+    """Approximate the memory used by a cached value in bytes"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, EncodedResponse):
+        # Slots only hold references; the bodies are what takes the memory
+        return size + obj.size
+    if depth > 8:
+        return size
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k, depth + 1) + estimate_size(v, depth + 1) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, depth + 1) for item in obj)
+    return size
+
+class CacheBackend(ABC):
+    """
+    Storage interface used by utils.cache
+
+    Entries are stored with their write timestamp, soft timeout and hard
+    timeout; expiry decisions are made by utils.cache. Implementations must
+    be safe to call from several threads, as utils.cache calls them without
+    holding a lock of its own.
+    """
+
+    @abstractmethod
+    def get(self, key):
+        """Return (timestamp, timeout, hard_timeout, data) or None"""
+
+    @abstractmethod
+    def set(self, key, timestamp, timeout, hard_timeout, data):
+        """Store an entry, evicting others if the backend is over budget"""
+
+    def set_many(self, entries):
+        """Store several (key, timestamp, timeout, hard_timeout, data) entries"""
+        for entry in entries:
+            self.set(*entry)
+
+    @abstractmethod
+    def delete(self, key):
+        """Remove an entry if it exists"""
+
+    @abstractmethod
+    def clear(self):
+        """Remove all entries"""
+
+    @abstractmethod
+    def expire(self, now):
+        """Remove entries past their hard timeout and return how many were removed"""
+
+    @abstractmethod
+    def stats(self):
+        """Return a dict with at least entries, bytes and evictions"""
+
+class MemoryBackend(CacheBackend):
+    """Per-process LRU cache bounded by an approximate byte budget"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[3]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            timestamp, timeout, hard_timeout, _, data = entry
+            return timestamp, timeout, hard_timeout, data
+
+    def set(self, key, timestamp, timeout, hard_timeout, data):
+        self.set_many([(key, timestamp, timeout, hard_timeout, data)])
+
+    def set_many(self, entries):
+        # All entries are inserted under one lock hold, so readers see either
+        # none or all of them
+        rows = []
+        for key, timestamp, timeout, hard_timeout, data in entries:
+            size = estimate_size(data)
+            if size > self.max_bytes:
+                logger.warning(f"Not caching {key}: {size} bytes exceeds the cache budget")
+                continue
+            rows.append((key, (timestamp, timeout, hard_timeout, size, data)))
+
+        with self._lock:
+            for key, entry in rows:
+                if key in self._entries:
+                    self._remove(key)
+                self._entries[key] = entry
+                self._bytes += entry[3]
+
+            # Evict least recently used entries until we are back under budget
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def expire(self, now):
+        with self._lock:
+            expired_keys = [
+                key for key, (timestamp, _, hard_timeout, _, _) in self._entries.items()
+                if now - timestamp >= hard_timeout
+            ]
+            for key in expired_keys:
+                self._remove(key)
+        return len(expired_keys)
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._entries), "bytes": self._bytes,
+                    "max_bytes": self.max_bytes, "evictions": self._evictions}
+
+class SQLiteBackend(CacheBackend):
+    """
+    Cache shared by all worker processes on a host, stored in a SQLite
+    database in WAL mode so readers never block the writer
+
+    Values are pickled. Eviction is approximately LRU: the access time of an
+    entry is only rewritten when it is older than ACCESS_RESOLUTION seconds,
+    which keeps cache hits from turning into a write on every read.
+    """
+
+    ACCESS_RESOLUTION = 30
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._evictions = 0
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, timestamp REAL, timeout REAL, hard_timeout REAL,"
+            " accessed REAL, size INTEGER, data BLOB)"
+        )
+        self._connection().execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT timestamp, timeout, hard_timeout, accessed, data FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        timestamp, timeout, hard_timeout, accessed, blob = row
+        now = time.time()
+        if now - accessed > self.ACCESS_RESOLUTION:
+            conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+
+        try:
+            return timestamp, timeout, hard_timeout, pickle.loads(blob)
+        except Exception as e:
+            logger.warning(f"Dropping unreadable cache entry {key}: {str(e)}")
+            self.delete(key)
+            return None
+
+    def set(self, key, timestamp, timeout, hard_timeout, data):
+        self.set_many([(key, timestamp, timeout, hard_timeout, data)])
+
+    def set_many(self, entries):
+        # All entries are written in one transaction, so other workers see
+        # either none or all of them
+        rows = []
+        for key, timestamp, timeout, hard_timeout, data in entries:
+            blob = pickle.dumps(data, protocol=PICKLE_PROTOCOL)
+            if len(blob) > self.max_bytes:
+                logger.warning(f"Not caching {key}: {len(blob)} bytes exceeds the cache budget")
+                continue
+            rows.append((key, timestamp, timeout, hard_timeout, timestamp, len(blob), sqlite3.Binary(blob)))
+        if not rows:
+            return
+
+        keys = [row[0] for row in rows]
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache (key, timestamp, timeout, hard_timeout, accessed, size, data)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+
+            # Evict least recently used entries until we are back under budget
+            placeholders = ",".join("?" * len(keys))
+            while total > self.max_bytes:
+                victim = conn.execute(
+                    f"SELECT key, size FROM cache WHERE key NOT IN ({placeholders}) ORDER BY accessed LIMIT 1", keys
+                ).fetchone()
+                if victim is None:
+                    break
+                conn.execute("DELETE FROM cache WHERE key = ?", (victim[0],))
+                total -= victim[1]
+                self._evictions += 1
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache")
+
+    def expire(self, now):
+        cursor = self._connection().execute("DELETE FROM cache WHERE ? - timestamp >= hard_timeout", (now,))
+        return cursor.rowcount
+
+    def stats(self):
+        entries, size = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache"
+        ).fetchone()
+        return {"backend": "sqlite", "entries": entries, "bytes": size,
+                "max_bytes": self.max_bytes, "evictions": self._evictions}
+
+def create_backend(name, max_bytes):
+    """
+    Create a cache backend by name
+
+    Args:
+        name: "memory" (per process) or "sqlite" (shared by all workers on a host)
+        max_bytes: Byte budget for cached data
+
+    Returns:
+        CacheBackend instance
+    """
+    if name == "sqlite":
+        path = os.environ.get("CACHE_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "stock_api_cache.sqlite"))
+        logger.info(f"Using shared SQLite cache at {path}")
+        return SQLiteBackend(path, max_bytes)
+    if name != "memory":
+        logger.warning(f"Unknown cache backend {name}, using in-memory cache")
+    return MemoryBackend(max_bytes)
@@ -0,0 +1,105 @@
+import os
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from threading import BoundedSemaphore, Lock
+
+# Configure module logger
+logger = logging.getLogger(__name__)
+
+# Size of the shared worker pool used for per-symbol upstream calls
+FANOUT_MAX_WORKERS = int(os.environ.get("FANOUT_MAX_WORKERS", 16))
+
+# Maximum number of in-flight calls per provider, across all requests
+PROVIDER_CONCURRENCY = {
+    "yahoo": int(os.environ.get("YAHOO_MAX_CONCURRENCY", 8)),
+    "fmp": int(os.environ.get("FMP_MAX_CONCURRENCY", 4)),
+    "alpha_vantage": int(os.environ.get("ALPHA_VANTAGE_MAX_CONCURRENCY", 1)),
+}
+DEFAULT_PROVIDER_CONCURRENCY = 4
+
+# Outcome of a single fan-out call; exactly one of value/error is meaningful
+FanOutResult = namedtuple("FanOutResult", ["item", "value", "error"])
+
+_executor = None
+_executor_lock = Lock()
+_semaphores = {}
+
+def get_executor():
+    """Get the shared fan-out thread pool, creating it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=FANOUT_MAX_WORKERS, thread_name_prefix="fanout")
+        return _executor
+
+def _provider_limit(provider):
+    return PROVIDER_CONCURRENCY.get(provider, DEFAULT_PROVIDER_CONCURRENCY)
+
+def _provider_semaphore(provider):
+    with _executor_lock:
+        if provider not in _semaphores:
+            _semaphores[provider] = BoundedSemaphore(_provider_limit(provider))
+        return _semaphores[provider]
+
+def fan_out(func, items, provider=None):
+    """
+    Call func(item) for every item concurrently on the shared worker pool
+
+    At most PROVIDER_CONCURRENCY[provider] calls for the same provider are in
+    flight at once, process-wide. The provider slot is taken before a call is
+    submitted, so calls waiting for a busy provider wait here rather than in
+    pool threads other providers need. Must not be called from inside a
+    fan-out task.
+
+    Args:
+        func: Function taking a single item
+        items: Items to process (e.g. stock symbols)
+        provider: Provider name used for the concurrency cap (optional)
+
+    Returns:
+        List of FanOutResult in the same order as items
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    semaphore = _provider_semaphore(provider)
+    window = max(1, min(_provider_limit(provider), FANOUT_MAX_WORKERS))
+    executor = get_executor()
+
+    def call(item):
+        try:
+            return func(item)
+        finally:
+            semaphore.release()
+
+    results = [None] * len(items)
+    pending = {}
+    next_index = 0
+
+    # Keep at most `window` tasks submitted so one call cannot flood the pool
+    while next_index < len(items) or pending:
+        while next_index < len(items) and len(pending) < window:
+            # Only block for a slot when none of our own calls can free one
+            if not semaphore.acquire(blocking=not pending):
+                break
+            try:
+                future = executor.submit(call, items[next_index])
+            except Exception:
+                semaphore.release()
+                raise
+            pending[future] = next_index
+            next_index += 1
+
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = pending.pop(future)
+            error = future.exception()
+            if error is not None:
+                logger.debug(f"Fan-out call for {items[index]} failed: {str(error)}")
+                results[index] = FanOutResult(items[index], None, error)
+            else:
+                results[index] = FanOutResult(items[index], future.result(), None)
+
+    return results
@@ -0,0 +1,154 @@
+import os
+import json
+import queue
+import logging
+from threading import Lock
+
+try:
+    from gevent import monkey
+except ImportError:  # gevent is optional, streams then need STREAM_THREADED_WORKERS
+    monkey = None
+
+# Configure module logger
+logger = logging.getLogger(__name__)
+
+# Messages buffered per client; a client that falls this far behind is dropped
+STREAM_QUEUE_SIZE = int(os.environ.get("STREAM_QUEUE_SIZE", 16))
+# Seconds between keep-alive comments on an idle stream
+STREAM_HEARTBEAT = int(os.environ.get("STREAM_HEARTBEAT", 15))
+# Upper bound on open streams per process
+STREAM_MAX_CLIENTS = int(os.environ.get("STREAM_MAX_CLIENTS", 5000))
+# Milliseconds browsers wait before reconnecting a dropped stream
+STREAM_RETRY_MS = int(os.environ.get("STREAM_RETRY_MS", 5000))
+# An open stream holds its worker; on threaded workers (python app.py) that
+# is one thread per browser tab, so streams are only served on gevent
+# workers unless this is set
+STREAM_THREADED_WORKERS = int(os.environ.get("STREAM_THREADED_WORKERS", 0))
+
+_subscribers = set()
+_subscribers_lock = Lock()
+_stats = {
+    "published": 0,
+    "dropped": 0,
+    "rejected": 0,
+}
+
+class Subscriber:
+    """An open event stream with its bounded message queue"""
+
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self.dropped = False
+
+def format_event(event, data, event_id=None):
+    """
+    Encode one Server-Sent Events message
+
+    Args:
+        event: Event name
+        data: JSON-serializable payload
+        event_id: Optional id, sent back by browsers as Last-Event-ID on reconnect
+
+    Returns:
+        Message bytes
+    """
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'), default=str)}")
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+def streams_available():
+    """Whether this process serves event streams: on gevent workers, or when allowed on threaded ones"""
+    if STREAM_THREADED_WORKERS:
+        return True
+    return monkey is not None and monkey.is_module_patched("socket")
+
+def subscribe():
+    """
+    Register a new event stream
+
+    Returns:
+        Subscriber, or None if the process already serves STREAM_MAX_CLIENTS streams
+    """
+    with _subscribers_lock:
+        if len(_subscribers) >= STREAM_MAX_CLIENTS:
+            _stats["rejected"] += 1
+            return None
+        subscriber = Subscriber()
+        _subscribers.add(subscriber)
+        return subscriber
+
+def unsubscribe(subscriber):
+    """Remove an event stream, e.g. when the client disconnected"""
+    with _subscribers_lock:
+        _subscribers.discard(subscriber)
+
+def publish_event(event, data, event_id=None):
+    """
+    Send an event to every open stream
+
+    The message is encoded once and offered to each client without blocking.
+    Clients whose queue is full are dropped; browsers reconnect on their own
+    and resume from their Last-Event-ID.
+
+    Args:
+        event: Event name
+        data: JSON-serializable payload
+        event_id: Optional event id
+    """
+    message = format_event(event, data, event_id)
+
+    with _subscribers_lock:
+        subscribers = list(_subscribers)
+        _stats["published"] += 1
+
+    dropped = []
+    for subscriber in subscribers:
+        try:
+            subscriber.queue.put_nowait(message)
+        except queue.Full:
+            subscriber.dropped = True
+            dropped.append(subscriber)
+
+    if dropped:
+        with _subscribers_lock:
+            _subscribers.difference_update(dropped)
+            _stats["dropped"] += len(dropped)
+        logger.warning(f"Dropped {len(dropped)} slow event stream clients")
+
+def iter_events(subscriber, initial=()):
+    """
+    Yield messages for one stream until the client is dropped or disconnects
+
+    Args:
+        subscriber: Subscriber from subscribe()
+        initial: Messages to send before any published event
+
+    Yields:
+        Message bytes, with keep-alive comments while idle
+    """
+    try:
+        # Sent right away so the response headers go out without waiting for an event
+        yield f"retry: {STREAM_RETRY_MS}\n\n".encode("utf-8")
+        yield from initial
+        while not subscriber.dropped:
+            try:
+                message = subscriber.queue.get(timeout=STREAM_HEARTBEAT)
+            except queue.Empty:
+                yield b": keep-alive\n\n"
+                continue
+            if subscriber.dropped:
+                break
+            yield message
+    finally:
+        # Runs when the stream ends or the server closes the generator on disconnect
+        unsubscribe(subscriber)
+
+def get_stream_stats():
+    """Get open stream count, published/dropped/rejected counters and whether streams are served"""
+    with _subscribers_lock:
+        return dict(_stats, clients=len(_subscribers), available=streams_available())
@@ -0,0 +1,252 @@
+import json
+import gzip
+import hashlib
+import logging
+from flask import Response, request, stream_with_context
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, responses fall back to gzip
+    brotli = None
+
+try:
+    import pyarrow
+except ImportError:  # pyarrow is optional, Arrow IPC is only offered when installed
+    pyarrow = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, MessagePack is only offered when installed
+    msgpack = None
+
+# Configure module logger
+logger = logging.getLogger(__name__)
+
+# Payloads smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+JSON_MIMETYPE = "application/json"
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+MSGPACK_MIMETYPE = "application/msgpack"
+
+class EncodedResponse:
+    """
+    A response body encoded once and reused for every cache hit
+
+    Holds the JSON bytes, their gzip and brotli variants and a strong ETag
+    derived from the JSON bytes. Each content coding gets its own ETag suffix
+    so that caches never mix representations. Partial responses, missing
+    data that was not fetched in time, are flagged so they are cached briefly.
+    """
+
+    __slots__ = ("body", "gzip_body", "br_body", "etag", "mimetype", "partial")
+
+    def __init__(self, body, mimetype=JSON_MIMETYPE):
+        self.body = body
+        self.mimetype = mimetype
+        self.partial = False
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.gzip_body = None
+        self.br_body = None
+
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.gzip_body = gzip.compress(body, compresslevel=6, mtime=0)
+            if brotli is not None:
+                self.br_body = brotli.compress(body, quality=9)
+
+    @property
+    def size(self):
+        """Bytes held by the body and its compressed variants"""
+        return sum(len(body) for body in (self.body, self.gzip_body, self.br_body) if body is not None)
+
+def encode_json(data):
+    """
+    Encode data as compact JSON, ready to be cached and served
+
+    Args:
+        data: JSON-serializable data
+
+    Returns:
+        EncodedResponse
+    """
+    body = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+    return EncodedResponse(body)
+
+def encode_arrow(payload):
+    """
+    Encode a columnar payload as an Arrow IPC stream with one record batch
+
+    Columns listed in the payload's dictionaries become dictionary-encoded
+    string columns; metadata is stored in the schema metadata.
+
+    Args:
+        payload: Dictionary with "columns" (name -> NumPy array),
+            "dictionaries" (name -> list of values) and "metadata"
+
+    Returns:
+        EncodedResponse
+    """
+    arrays = []
+    for name, values in payload["columns"].items():
+        if name in payload["dictionaries"]:
+            arrays.append(pyarrow.DictionaryArray.from_arrays(
+                pyarrow.array(values, type=pyarrow.int32()),
+                pyarrow.array(payload["dictionaries"][name], type=pyarrow.string())
+            ))
+        elif values.dtype == object:
+            arrays.append(pyarrow.array(values, type=pyarrow.string(), from_pandas=True))
+        else:
+            arrays.append(pyarrow.array(values))
+
+    metadata = {key: str(value) for key, value in payload["metadata"].items()}
+    batch = pyarrow.RecordBatch.from_arrays(arrays, names=list(payload["columns"]))
+    batch = batch.replace_schema_metadata(metadata)
+
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return EncodedResponse(sink.getvalue().to_pybytes(), mimetype=ARROW_MIMETYPE)
+
+def encode_msgpack(payload):
+    """
+    Encode a columnar payload as MessagePack
+
+    The document is {"columns": {name: [values]}, "dictionaries": {name: [values]},
+    "metadata": {...}}, i.e. one array per field instead of one map per row.
+
+    Args:
+        payload: Dictionary with "columns", "dictionaries" and "metadata"
+
+    Returns:
+        EncodedResponse
+    """
+    document = {
+        "columns": {name: values.tolist() for name, values in payload["columns"].items()},
+        "dictionaries": payload["dictionaries"],
+        "metadata": payload["metadata"],
+    }
+    return EncodedResponse(msgpack.packb(document, use_bin_type=True, default=str), mimetype=MSGPACK_MIMETYPE)
+
+def negotiate_format():
+    """
+    Pick the response encoding from the request's Accept header
+
+    Binary encodings are only offered when their library is installed. JSON
+    is preferred when the client accepts several formats equally, so browsers
+    sending */* keep getting JSON.
+
+    Returns:
+        "json", "arrow" or "msgpack"
+    """
+    offers = [(JSON_MIMETYPE, "json")]
+    if pyarrow is not None:
+        offers.append((ARROW_MIMETYPE, "arrow"))
+    if msgpack is not None:
+        offers += [(MSGPACK_MIMETYPE, "msgpack"), ("application/x-msgpack", "msgpack")]
+
+    best = request.accept_mimetypes.best_match([mimetype for mimetype, _ in offers], default=JSON_MIMETYPE)
+    return dict(offers)[best]
+
+def available_formats():
+    """Binary formats whose library is installed, e.g. ["arrow", "msgpack"]"""
+    formats = []
+    if pyarrow is not None:
+        formats.append("arrow")
+    if msgpack is not None:
+        formats.append("msgpack")
+    return formats
+
+def encode_columns(payload, output_format):
+    """
+    Encode a columnar payload in a negotiated binary format
+
+    Args:
+        payload: Dictionary with "columns", "dictionaries" and "metadata"
+        output_format: "arrow" or "msgpack"
+
+    Returns:
+        EncodedResponse
+    """
+    if output_format == "arrow":
+        return encode_arrow(payload)
+    return encode_msgpack(payload)
+
+def _etag_matches(encoded):
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        # Weak comparison is fine for conditional GETs (RFC 9110 13.1.2)
+        tag = tag[2:] if tag.startswith("W/") else tag
+        if tag.strip('"').split("-")[0] == encoded.etag:
+            return True
+    return False
+
+def send_encoded(encoded, vary_accept=False):
+    """
+    Build a response from a cached EncodedResponse
+
+    Returns 304 when the client's If-None-Match matches, otherwise the best
+    pre-compressed variant the client accepts.
+
+    Args:
+        encoded: EncodedResponse
+        vary_accept: Whether the route negotiates the format from the Accept header
+
+    Returns:
+        Flask Response
+    """
+    vary = "Accept, Accept-Encoding" if vary_accept else "Accept-Encoding"
+    headers = {"Vary": vary, "Cache-Control": "no-cache"}
+
+    body, etag = encoded.body, encoded.etag
+    if encoded.br_body is not None and request.accept_encodings["br"]:
+        body, etag = encoded.br_body, f"{encoded.etag}-br"
+        headers["Content-Encoding"] = "br"
+    elif encoded.gzip_body is not None and request.accept_encodings["gzip"]:
+        body, etag = encoded.gzip_body, f"{encoded.etag}-gz"
+        headers["Content-Encoding"] = "gzip"
+    headers["ETag"] = f'"{etag}"'
+
+    if _etag_matches(encoded):
+        headers.pop("Content-Encoding", None)
+        return Response(status=304, headers=headers)
+
+    return Response(body, mimetype=encoded.mimetype, headers=headers)
+
+def stream_ndjson(records):
+    """
+    Stream records as newline-delimited JSON
+
+    Each record is encoded and sent as soon as the generator produces it,
+    so neither the server nor the client has to hold the whole response.
+
+    Args:
+        records: Iterable of JSON-serializable objects, one per line
+
+    Returns:
+        Flask streaming Response
+    """
+    def generate():
+        for record in records:
+            yield json.dumps(record, separators=(",", ":"), default=str).encode("utf-8") + b"\n"
+
+    # Ask proxies such as nginx not to buffer the stream
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson", headers=headers)
+
+def send_event_stream(messages):
+    """
+    Stream pre-encoded Server-Sent Events messages
+
+    Args:
+        messages: Iterable of message bytes, e.g. from utils.events.iter_events
+
+    Returns:
+        Flask streaming Response
+    """
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(messages), mimetype="text/event-stream", headers=headers)
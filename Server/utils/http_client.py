@@ -0,0 +1,108 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import functools
+from threading import Lock
+import requests
+from requests.adapters import HTTPAdapter
+from utils.concurrency import FANOUT_MAX_WORKERS
+
+# Configure module logger
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for a connection and for each read from an upstream API
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 3.05))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 10))
+
+# Retries after the first attempt, for connection errors, timeouts and 5xx
+# responses. 429s are not retried: the rate limiter decides when to call again.
+HTTP_MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", 2))
+HTTP_BACKOFF_BASE = float(os.environ.get("HTTP_BACKOFF_BASE", 0.25))
+HTTP_BACKOFF_MAX = float(os.environ.get("HTTP_BACKOFF_MAX", 4))
+RETRY_STATUSES = {500, 502, 503, 504}
+
+# One pooled keep-alive session per provider
+_sessions = {}
+_sessions_lock = Lock()
+
+class UpstreamError(Exception):
+    """An upstream API call failed after all retries"""
+
+def _session(provider):
+    """Get the shared session of a provider, creating it on first use"""
+    with _sessions_lock:
+        session = _sessions.get(provider)
+        if session is None:
+            session = requests.Session()
+            # Enough pooled connections for every fan-out worker; retries are done here
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=FANOUT_MAX_WORKERS, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[provider] = session
+        return session
+
+def _backoff(attempt):
+    """Exponential backoff with full jitter, in seconds"""
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+def get_json(provider, url, params=None, deadline=None, retries=None):
+    """
+    GET a JSON document from an upstream API
+
+    Connections are pooled and kept alive per provider. Failed attempts are
+    retried with jittered exponential backoff, but never past the deadline.
+
+    Args:
+        provider: Provider name, e.g. "fmp" or "alpha_vantage"
+        url: Request URL
+        params: Query parameters (optional)
+        deadline: time.monotonic() value by which the call must be done (optional)
+        retries: Retries after the first attempt (default: HTTP_MAX_RETRIES)
+
+    Returns:
+        Decoded JSON response
+
+    Raises:
+        UpstreamError: If every attempt failed or the deadline passed
+    """
+    retries = HTTP_MAX_RETRIES if retries is None else retries
+    session = _session(provider)
+    error = None
+
+    for attempt in range(retries + 1):
+        read_timeout = HTTP_READ_TIMEOUT
+        if deadline is not None:
+            read_timeout = min(read_timeout, deadline - time.monotonic())
+            if read_timeout <= 0:
+                break
+
+        try:
+            response = session.get(url, params=params, timeout=(HTTP_CONNECT_TIMEOUT, read_timeout))
+            if response.status_code not in RETRY_STATUSES:
+                response.raise_for_status()
+                return response.json()
+            error = requests.HTTPError(f"{response.status_code} from {provider}", response=response)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+
+        if attempt < retries:
+            delay = _backoff(attempt)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                break
+            logger.debug(f"Retrying {provider} request in {delay:.2f}s after: {str(error)}")
+            time.sleep(delay)
+
+    raise UpstreamError(f"{provider} request failed: {str(error) if error else 'deadline exceeded'}")
+
+async def get_json_async(provider, url, params=None, deadline=None, retries=None):
+    """
+    Awaitable version of get_json for asyncio callers
+
+    The request runs on the event loop's default executor and shares the
+    same pooled sessions as get_json.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(get_json, provider, url, params=params, deadline=deadline, retries=retries)
+    return await loop.run_in_executor(None, call)
@@ -0,0 +1,97 @@
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+# US equity exchanges (NYSE/Nasdaq) trade on New York time
+EXCHANGE_TZ = ZoneInfo("America/New_York")
+
+REGULAR_OPEN = time(9, 30)
+REGULAR_CLOSE = time(16, 0)
+EXTENDED_OPEN = time(4, 0)
+EXTENDED_CLOSE = time(20, 0)
+
+def _nth_weekday(year, month, weekday, n):
+    """Date of the n-th given weekday (Monday is 0) in a month"""
+    first = date(year, month, 1)
+    return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+def _last_weekday(year, month, weekday):
+    """Date of the last given weekday in a month"""
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _easter(year):
+    """Easter Sunday (Gregorian calendar, anonymous algorithm)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def _observed(day):
+    """Holidays on a Saturday are observed on Friday, on a Sunday on Monday"""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+@lru_cache(maxsize=None)
+def exchange_holidays(year):
+    """
+    Full-day exchange holidays for a year
+
+    Args:
+        year: Calendar year
+
+    Returns:
+        Frozenset of dates the market is closed (besides weekends)
+    """
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),          # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),          # Washington's Birthday
+        _easter(year) - timedelta(days=2),    # Good Friday
+        _last_weekday(year, 5, 0),            # Memorial Day
+        _observed(date(year, 7, 4)),          # Independence Day
+        _nth_weekday(year, 9, 0, 1),          # Labor Day
+        _nth_weekday(year, 11, 3, 4),         # Thanksgiving
+        _observed(date(year, 12, 25)),        # Christmas
+    }
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))  # Juneteenth
+    # New Year's Day falling on a Saturday is not observed on the Friday before
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(_observed(new_year))
+    return frozenset(holidays)
+
+def is_trading_day(day):
+    """Whether the exchange is open on a date"""
+    return day.weekday() < 5 and day not in exchange_holidays(day.year)
+
+def market_session(now=None):
+    """
+    Get the exchange session at a point in time
+
+    Args:
+        now: Aware or naive-local datetime (default: current time)
+
+    Returns:
+        "regular" during regular trading hours, "extended" during pre- and
+        post-market hours, otherwise "closed"
+    """
+    local = (now or datetime.now().astimezone()).astimezone(EXCHANGE_TZ)
+    if not is_trading_day(local.date()):
+        return "closed"
+    clock = local.time()
+    if REGULAR_OPEN <= clock < REGULAR_CLOSE:
+        return "regular"
+    if EXTENDED_OPEN <= clock < EXTENDED_CLOSE:
+        return "extended"
+    return "closed"
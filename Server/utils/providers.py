@@ -0,0 +1,320 @@
+import os
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from threading import Lock
+
+# Configure module logger
+logger = logging.getLogger(__name__)
+
+# Calls of the last PROVIDER_WINDOW_SECONDS (at most PROVIDER_WINDOW_CALLS) make up a provider's health
+PROVIDER_WINDOW_SECONDS = int(os.environ.get("PROVIDER_WINDOW_SECONDS", 300))
+PROVIDER_WINDOW_CALLS = int(os.environ.get("PROVIDER_WINDOW_CALLS", 100))
+
+# A provider's circuit opens when, over at least BREAKER_MIN_CALLS calls, its
+# error rate or its p95 latency (seconds) reaches the limit; after
+# BREAKER_COOLDOWN seconds a single trial call decides whether it closes again
+BREAKER_MIN_CALLS = int(os.environ.get("BREAKER_MIN_CALLS", 5))
+BREAKER_ERROR_RATE = float(os.environ.get("BREAKER_ERROR_RATE", 0.5))
+BREAKER_SLOW_SECONDS = float(os.environ.get("BREAKER_SLOW_SECONDS", 20))
+BREAKER_COOLDOWN = float(os.environ.get("BREAKER_COOLDOWN", 30))
+
+# A backup request to the next provider is sent once a call runs longer than
+# the provider's p95 latency, bounded by these limits (seconds). Until enough
+# calls were seen, HEDGE_DEFAULT_DELAY is used.
+HEDGE_MIN_DELAY = float(os.environ.get("HEDGE_MIN_DELAY", 0.5))
+HEDGE_MAX_DELAY = float(os.environ.get("HEDGE_MAX_DELAY", 10))
+HEDGE_DEFAULT_DELAY = float(os.environ.get("HEDGE_DEFAULT_DELAY", 3))
+HEDGE_MAX_WORKERS = int(os.environ.get("HEDGE_MAX_WORKERS", 8))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class LocalResult(list):
+    """
+    Result of a fetch that made no upstream call
+
+    E.g. quotes served from a local store, or nothing because no call could
+    be made in time. Used like a list, but left out of the provider's health:
+    it says nothing about the provider's error rate or latency.
+    """
+
+class CircuitBreaker:
+    """
+    Rolling error-rate and latency window of one provider
+
+    Closed: calls go through. Open: calls are skipped until the cooldown has
+    passed. Half-open: one trial call is let through; its outcome closes or
+    re-opens the circuit.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.trial_running = False
+        self.calls = deque(maxlen=PROVIDER_WINDOW_CALLS)
+        self.counters = {"calls": 0, "failures": 0, "skipped": 0, "hedged": 0, "opened": 0}
+        self._lock = Lock()
+
+    def _prune(self, now):
+        while self.calls and now - self.calls[0][0] > PROVIDER_WINDOW_SECONDS:
+            self.calls.popleft()
+
+    def _p95(self):
+        latencies = sorted(latency for _, ok, latency in self.calls if ok)
+        if len(latencies) < BREAKER_MIN_CALLS:
+            return None
+        return latencies[int(0.95 * (len(latencies) - 1))]
+
+    def allow(self):
+        """Whether a call may be made now; claims the trial slot when half-open"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= BREAKER_COOLDOWN:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self.trial_running:
+                self.trial_running = True
+                return True
+            self.counters["skipped"] += 1
+            return False
+
+    def record(self, ok, latency):
+        """
+        Record the outcome of a call
+
+        Args:
+            ok: Whether the call succeeded; an empty answer is a success
+            latency: Duration of the call in seconds
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.counters["calls"] += 1
+            if not ok:
+                self.counters["failures"] += 1
+            self.calls.append((now, ok, latency))
+            self._prune(now)
+
+            if self.state == HALF_OPEN:
+                self.trial_running = False
+                if ok:
+                    logger.info(f"Provider {self.name} recovered, closing its circuit")
+                    self.state = CLOSED
+                    self.calls.clear()
+                else:
+                    self._open(now, "trial call failed")
+                return
+
+            if self.state == CLOSED and len(self.calls) >= BREAKER_MIN_CALLS:
+                failures = sum(1 for _, call_ok, _ in self.calls if not call_ok)
+                p95 = self._p95()
+                if failures / len(self.calls) >= BREAKER_ERROR_RATE:
+                    self._open(now, f"{failures}/{len(self.calls)} recent calls failed")
+                elif p95 is not None and p95 >= BREAKER_SLOW_SECONDS:
+                    self._open(now, f"p95 latency {p95:.1f}s")
+
+    def release_trial(self):
+        """Free the half-open trial slot after a call that is not recorded"""
+        with self._lock:
+            self.trial_running = False
+
+    def _open(self, now, reason):
+        logger.warning(f"Opening circuit for provider {self.name}: {reason}")
+        self.state = OPEN
+        self.opened_at = now
+        self.counters["opened"] += 1
+
+    def count_hedge(self):
+        """Count a call that was hedged to another provider"""
+        with self._lock:
+            self.counters["hedged"] += 1
+
+    def usual_latency(self):
+        """The provider's p95 latency in seconds, HEDGE_DEFAULT_DELAY until enough calls were seen"""
+        with self._lock:
+            self._prune(time.monotonic())
+            p95 = self._p95()
+        return HEDGE_DEFAULT_DELAY if p95 is None else p95
+
+    def hedge_delay(self):
+        """Seconds to wait for a call before hedging it to the next provider"""
+        with self._lock:
+            self._prune(time.monotonic())
+            p95 = self._p95()
+        if p95 is None:
+            return HEDGE_DEFAULT_DELAY
+        return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, p95))
+
+    def health(self):
+        """Current state, rolling error rate and p95 latency, and counters"""
+        with self._lock:
+            self._prune(time.monotonic())
+            count = len(self.calls)
+            failures = sum(1 for _, ok, _ in self.calls if not ok)
+            p95 = self._p95()
+            return dict(
+                self.counters,
+                state=self.state,
+                window_calls=count,
+                error_rate=round(failures / count, 3) if count else 0.0,
+                p95_latency=round(p95, 3) if p95 is not None else None,
+            )
+
+# Registered providers in registration order: name -> (fetch, CircuitBreaker)
+_providers = {}
+_providers_lock = Lock()
+_executor = None
+
+def _get_executor():
+    """
+    Get the hedging thread pool, creating it on first use
+
+    Separate from the fan-out pool because providers fan out themselves.
+    """
+    global _executor
+    with _providers_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix="provider")
+        return _executor
+
+def register_provider(name, fetch):
+    """
+    Register a data provider
+
+    Args:
+        name: Provider name, e.g. "yahoo"
+        fetch: Function taking the fetch arguments and a deadline keyword,
+            returning a list of results (a LocalResult if it made no upstream
+            call) and raising on upstream failures
+    """
+    with _providers_lock:
+        _providers[name] = (fetch, CircuitBreaker(name))
+
+def _timed_call(name, fetch, breaker, args, deadline):
+    start = time.monotonic()
+    try:
+        result = fetch(*args, deadline=deadline)
+        ok = True
+    except Exception as e:
+        logger.error(f"Provider {name} failed: {str(e)}")
+        result, ok = [], False
+
+    # A call cut off by the request's deadline counts as failed once it ran
+    # longer than the provider usually takes, so a hanging provider still
+    # opens its circuit; a budget shorter than that says nothing about it
+    latency = time.monotonic() - start
+    truncated = not ok and deadline is not None and time.monotonic() >= deadline
+    if isinstance(result, LocalResult) or (truncated and latency < breaker.usual_latency()):
+        breaker.release_trial()
+    else:
+        breaker.record(ok, latency)
+    return result
+
+def _merge(finished):
+    """Merge finished results, preferring items of more preferred providers"""
+    merged, seen = [], set()
+    for _, result in sorted(finished, key=lambda entry: entry[0]):
+        for item in result:
+            if item.symbol not in seen:
+                seen.add(item.symbol)
+                merged.append(item)
+    return merged
+
+def fetch_with_failover(names, *args, deadline=None, wanted=None):
+    """
+    Call providers in order of preference until one returns data
+
+    Providers with an open circuit are skipped right away. When the current
+    call runs past its provider's p95 latency, the next healthy provider is
+    called as well. Calls that lose the race keep running in the background
+    and still count towards health.
+
+    Results are ranked by how many of the wanted symbols they cover: a
+    result covering all of them wins right away, while a partial one from a
+    hedge only fills in until every more preferred call has finished, so a
+    slow primary is not beaten by a hedge that answered for one symbol.
+
+    Args:
+        names: Provider names, most preferred first
+        *args: Arguments passed to each provider's fetch function
+        deadline: time.monotonic() value to give up at (optional); also
+            passed to each fetch function as the deadline keyword
+        wanted: Symbols a complete result covers (optional); without them,
+            any non-empty result is complete. Results are matched on the
+            symbol attribute of their items.
+
+    Returns:
+        The first complete result; otherwise the partial results merged,
+        more preferred providers first, or an empty list if every provider
+        failed or none returned data before the deadline
+    """
+    with _providers_lock:
+        candidates = iter(enumerate((name,) + _providers[name] for name in names if name in _providers))
+    wanted = set(wanted) if wanted is not None else None
+
+    executor = _get_executor()
+    pending = {}
+    finished = []
+
+    def launch_next():
+        # Start the next provider whose circuit lets the call through
+        for rank, (name, fetch, breaker) in candidates:
+            if breaker.allow():
+                pending[executor.submit(_timed_call, name, fetch, breaker, args, deadline)] = (rank, breaker)
+                return breaker
+            logger.debug(f"Skipping provider {name}, circuit is {breaker.state}")
+        return None
+
+    def complete(result):
+        return bool(result) and (wanted is None or wanted <= {item.symbol for item in result})
+
+    newest = launch_next()
+    while pending:
+        timeout = newest.hedge_delay() if newest is not None else None
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+        if not done:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            # The newest call is slower than usual: hedge it to the next provider
+            slow = newest
+            newest = launch_next()
+            if newest is not None:
+                slow.count_hedge()
+                logger.debug(f"Provider {slow.name} exceeded {timeout:.2f}s, hedging to {newest.name}")
+            continue
+
+        for future in done:
+            rank, _ = pending.pop(future)
+            result = future.result()
+            if complete(result):
+                return result
+            if result:
+                finished.append((rank, result))
+
+        # Partial results are final once no more preferred call is running
+        if finished and all(rank > min(done_rank for done_rank, _ in finished) for rank, _ in pending.values()):
+            return _merge(finished)
+
+        # Every finished call failed; fall through to the next provider unless
+        # a hedged call is still running
+        if not pending:
+            newest = launch_next()
+
+    if pending:
+        logger.warning(f"No provider returned complete data before the deadline, {len(pending)} calls still running")
+    return _merge(finished)
+
+def get_provider_health():
+    """Get the health of every registered provider"""
+    with _providers_lock:
+        breakers = [breaker for _, breaker in _providers.values()]
+    return {breaker.name: breaker.health() for breaker in breakers}
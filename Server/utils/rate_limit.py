@@ -0,0 +1,128 @@
+import os
+import time
+import logging
+from threading import Lock
+
+# Configure module logger
+logger = logging.getLogger(__name__)
+
+# Rate limits per provider and API key: calls allowed per period (seconds),
+# burst is the number of calls that may go out back to back. A burst of 1
+# spreads calls evenly over the period instead of bursting and then sleeping.
+PROVIDER_RATE_LIMITS = {
+    "alpha_vantage": {
+        "calls": int(os.environ.get("ALPHA_VANTAGE_CALLS_PER_MINUTE", 5)),
+        "period": 60,
+        "burst": 1,
+    },
+    "fmp": {
+        "calls": int(os.environ.get("FMP_CALLS_PER_MINUTE", 300)),
+        "period": 60,
+        "burst": 10,
+    },
+}
+
+# Longest a caller waits for a slot when it does not pass its own deadline
+DEFAULT_MAX_WAIT = float(os.environ.get("RATE_LIMIT_MAX_WAIT", 15))
+
+class RateLimitExceeded(Exception):
+    """Raised when no rate limit slot is available before the caller's deadline"""
+
+class TokenBucket:
+    """
+    Token bucket that hands out reservations
+
+    Tokens may go negative: a reservation taken while the bucket is empty is
+    scheduled at the time the token will have been refilled, so concurrent
+    callers are spaced out evenly rather than all waking up at once.
+    """
+
+    def __init__(self, calls, period, burst=1):
+        self.rate = calls / float(period)
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until the next reservation would be allowed to run"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def reserve(self, now):
+        """Take a token and return the seconds to wait before using it"""
+        wait = self.wait_time(now)
+        self.tokens -= 1
+        return wait
+
+class RateLimiter:
+    """Process-wide registry of token buckets per provider and API key"""
+
+    def __init__(self, limits=None):
+        self.limits = limits if limits is not None else PROVIDER_RATE_LIMITS
+        self._buckets = {}
+        self._keys = {}
+        self._lock = Lock()
+
+    def register_keys(self, provider, keys):
+        """
+        Register the API keys available for a provider
+
+        Args:
+            provider: Provider name
+            keys: List of API keys; calls are spread across all of them
+        """
+        limit = self.limits.get(provider)
+        with self._lock:
+            self._keys[provider] = [key for key in keys if key]
+            for key in self._keys[provider]:
+                if (provider, key) not in self._buckets and limit:
+                    self._buckets[(provider, key)] = TokenBucket(limit["calls"], limit["period"], limit.get("burst", 1))
+
+    def acquire(self, provider, deadline=None, block=True):
+        """
+        Reserve a call slot for a provider
+
+        Picks the API key whose bucket frees up first. If that slot would
+        start after the caller's deadline nothing is reserved.
+
+        Args:
+            provider: Provider name
+            deadline: time.monotonic() value the call must start before (optional)
+            block: Sleep until the reserved slot if True, else only take free slots
+
+        Returns:
+            The API key to use, or None if no slot is available in time
+        """
+        now = time.monotonic()
+        if deadline is None:
+            deadline = now + DEFAULT_MAX_WAIT
+
+        with self._lock:
+            keys = self._keys.get(provider, [])
+            if not keys:
+                return None
+
+            buckets = [(key, self._buckets.get((provider, key))) for key in keys]
+            # Providers without a configured limit are not throttled
+            if buckets[0][1] is None:
+                return keys[0]
+
+            key, bucket = min(buckets, key=lambda kb: kb[1].wait_time(now))
+            wait = bucket.wait_time(now)
+            if now + wait > deadline or (wait > 0 and not block):
+                return None
+            bucket.reserve(now)
+
+        if wait > 0:
+            logger.debug(f"Rate limit for {provider}: waiting {wait:.2f}s for the next slot")
+            time.sleep(wait)
+        return key
+
+# Shared limiter for all upstream providers
+rate_limiter = RateLimiter()